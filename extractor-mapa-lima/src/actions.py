@@ -97,10 +97,14 @@ def generar_png_desde_dot():
     
     try:
         print(f"Generando {png_path}...")
+        # La imagen va a archivo (-o): stdout no se captura; nslimit/mclimit
+        # acotan las iteraciones del layout en grafos grandes
         result = subprocess.run(
-            ["dot", "-Tpng", dot_path, "-o", png_path],
-            capture_output=True,
-            text=True
+            ["dot", "-Tpng", "-Gnslimit=2", "-Gmclimit=2", dot_path, "-o", png_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=600
         )
         
         if result.returncode == 0:
@@ -108,10 +112,13 @@ def generar_png_desde_dot():
             return True
         else:
             print(f"Error generando PNG:")
-            print(f"  Stdout: {result.stdout}")
             print(f"  Stderr: {result.stderr}")
             return False
             
+    except subprocess.TimeoutExpired:
+        print("Graphviz excedió el tiempo límite (600 s) generando el PNG")
+        print("Prueba exportar el grafo en modo 'reduced' con menos nodos")
+        return False
     except FileNotFoundError:
         print("Graphviz 'dot' no está disponible en el PATH del sistema")
         print("Instala Graphviz desde: https://graphviz.org/download/")
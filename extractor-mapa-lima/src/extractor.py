@@ -3,18 +3,58 @@
 Extractor de Red Vial
 Extrae la red de calles de Lima usando OSMnx
 """
-import pandas as pd
+import gzip
+import os
+import pickle
+import numpy as np
 import osmnx as ox
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
 import math
-import random
 import warnings
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+except ImportError:
+    # pyarrow es opcional: sin él se usa np.savetxt
+    pa = None
+    pcsv = None
+
+try:
+    from numba import njit
+except ImportError:
+    # numba es opcional: sin él las funciones se ejecutan en Python puro
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
 warnings.filterwarnings('ignore')
 
+EARTH_RADIUS = 6371000  # Radio de la Tierra en metros
+REFERENCE_LAT = math.radians(-12.05)  # Latitud de Lima para proyectar lat/lon al plano
+
+
+@njit(cache=True, fastmath=True)
+def _haversine_m(lat1, lon1, lat2, lon2):
+    # Distancia haversine en metros entre coordenadas en radianes
+    # sin(Δ/2) directo: la identidad (1 - cos Δ) / 2 ahorra un seno pero pierde
+    # toda la precisión en tramos de pocos metros por cancelación
+    sin_dlat = math.sin((lat2 - lat1) / 2)
+    sin_dlon = math.sin((lon2 - lon1) / 2)
+    a = sin_dlat * sin_dlat + math.cos(lat1) * math.cos(lat2) * sin_dlon * sin_dlon
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+
 class NetworkExtractor:
     """Extractor de red vial de Lima"""
     
+    GRAPH_CACHE = "dataset/lima_G.pkl.gz"
+    
     def __init__(self):
+        self._coords_rad = None
         self._configure_osmnx()
     
     def _configure_osmnx(self):
@@ -27,42 +67,30 @@ class NetworkExtractor:
     
     def extract_lima_network(self):
         """Extraer red vial de Lima"""
-        print("Descargando red vial de Lima...")
-        
         try:
-            # Método 1: Lima Metropolitana completa
-            try:
-                G = ox.graph_from_place(
-                    "Lima Metropolitan Area, Peru",
-                    network_type='drive',
-                    simplify=True
-                )
-                print(f"Red extraída: {len(G.nodes)} nodos, {len(G.edges)} aristas")
-            except:
-                # Método 2: Por coordenadas de Lima
-                print("Usando coordenadas de Lima...")
-                north, south, east, west = -11.8, -12.3, -76.8, -77.3
-                G = ox.graph_from_bbox(
-                    north=north, south=south, east=east, west=west,
-                    network_type='drive', simplify=True
-                )
-                print(f"Red extraída: {len(G.nodes)} nodos, {len(G.edges)} aristas")
+            G = self._load_cached_graph()
+            if G is None:
+                G = self._download_graph()
+                self._save_cached_graph(G)
+            
+            # Coordenadas en radianes, leídas una sola vez del grafo
+            self._cache_coords(G)
             
             # Mejorar conectividad si hay muchas componentes
             components = self._find_components(G)
             if len(components) > 5:
-                self._improve_connectivity(G)
+                self._improve_connectivity(G, components)
             
-            # Convertir a DataFrames
-            nodes_df, edges_df = self._to_dataframes(G)
+            # Convertir a tablas de columnas
+            nodes, edges = self._to_tables(G)
             
             # Guardar archivos
-            nodes_df.to_csv("dataset/lima_nodes.csv", index=False)
-            edges_df.to_csv("dataset/lima_edges.csv", index=False)
+            self._write_csv(nodes, "dataset/lima_nodes.csv", ["%d", "%d", "%.7f", "%.7f"])
+            self._write_csv(edges, "dataset/lima_edges.csv", ["%d", "%d", "%.3f"])
             
             print(f"Archivos guardados:")
-            print(f"  dataset/lima_nodes.csv ({len(nodes_df)} nodos)")
-            print(f"  dataset/lima_edges.csv ({len(edges_df)} aristas)")
+            print(f"  dataset/lima_nodes.csv ({len(nodes['node_id'])} nodos)")
+            print(f"  dataset/lima_edges.csv ({len(edges['node1'])} aristas)")
             
             return True
             
@@ -70,46 +98,94 @@ class NetworkExtractor:
             print(f"Error en extracción: {str(e)}")
             return False
     
+    def _write_csv(self, columns, path, fmt):
+        # Escribir {columna: arreglo} como CSV; fmt solo aplica sin pyarrow
+        header = ",".join(columns)
+        if pcsv is None:
+            np.savetxt(path, np.column_stack(list(columns.values())),
+                       fmt=fmt, delimiter=",", header=header, comments="")
+            return
+        
+        # Escritor en C++ de pyarrow; cabecera sin comillas escrita a mano
+        with open(path, 'wb') as f:
+            f.write((header + "\n").encode('utf-8'))
+            pcsv.write_csv(pa.table(columns), f, write_options=pcsv.WriteOptions(include_header=False))
+    
+    def _download_graph(self):
+        # Descargar la red vial con OSMnx
+        print("Descargando red vial de Lima...")
+        
+        # Método 1: Lima Metropolitana completa
+        try:
+            G = ox.graph_from_place(
+                "Lima Metropolitan Area, Peru",
+                network_type='drive',
+                simplify=True
+            )
+            print(f"Red extraída: {len(G.nodes)} nodos, {len(G.edges)} aristas")
+        except:
+            # Método 2: Por coordenadas de Lima
+            print("Usando coordenadas de Lima...")
+            north, south, east, west = -11.8, -12.3, -76.8, -77.3
+            G = ox.graph_from_bbox(
+                north=north, south=south, east=east, west=west,
+                network_type='drive', simplify=True
+            )
+            print(f"Red extraída: {len(G.nodes)} nodos, {len(G.edges)} aristas")
+        
+        return G
+    
+    def _load_cached_graph(self):
+        # Cargar el grafo descargado previamente (FORCE_REBUILD fuerza la descarga)
+        if os.getenv("FORCE_REBUILD") is not None or not os.path.exists(self.GRAPH_CACHE):
+            return None
+        
+        try:
+            with gzip.open(self.GRAPH_CACHE, 'rb') as f:
+                G = pickle.load(f)
+        except Exception as e:
+            print(f"No se pudo leer la caché del grafo: {str(e)}")
+            return None
+        
+        print(f"Red cargada desde caché: {len(G.nodes)} nodos, {len(G.edges)} aristas")
+        return G
+    
+    def _save_cached_graph(self, G):
+        # Guardar el grafo descargado para reutilizarlo en siguientes ejecuciones
+        try:
+            with gzip.open(self.GRAPH_CACHE, 'wb') as f:
+                pickle.dump(G, f, protocol=5)
+        except Exception as e:
+            print(f"No se pudo guardar la caché del grafo: {str(e)}")
+    
     def _find_components(self, G):
-        # Encontrar componentes conectados usando DFS
-        all_nodes = list(G.nodes())
-        visited = set()
-        components = []
+        # Encontrar componentes conectados sobre la matriz de adyacencia CSR
+        node_ids = list(G.nodes())
+        index = {node: i for i, node in enumerate(node_ids)}
+        n = len(node_ids)
+        if n == 0:
+            return []
         
-        for start_node in all_nodes:
-            if start_node in visited:
-                continue
-            
-            component = set()
-            stack = [start_node]
-            
-            while stack:
-                node = stack.pop()
-                if node in component:
-                    continue
-                
-                component.add(node)
-                visited.add(node)
-                
-                # Agregar vecinos
-                try:
-                    neighbors = list(G.neighbors(node))
-                    for neighbor in neighbors:
-                        if neighbor not in component:
-                            stack.append(neighbor)
-                except:
-                    pass
-            
-            if component:
-                components.append(component)
+        m = G.number_of_edges()
+        rows = np.fromiter((index[u] for u, _ in G.edges()), dtype=np.int64, count=m)
+        cols = np.fromiter((index[v] for _, v in G.edges()), dtype=np.int64, count=m)
+        adjacency = csr_matrix((np.ones(m, dtype=np.int8), (rows, cols)), shape=(n, n))
         
-        return components
+        n_components, labels = connected_components(adjacency, directed=False)
+        
+        # Agrupar nodos por etiqueta: cada componente es un arreglo de IDs
+        # (sin construir un set de Python por componente)
+        ids = np.array(node_ids, dtype=np.int64)
+        order = np.argsort(labels, kind='stable')
+        sizes = np.bincount(labels, minlength=n_components)
+        return [ids[group] for group in np.split(order, np.cumsum(sizes)[:-1])]
     
-    def _improve_connectivity(self, G):
+    def _improve_connectivity(self, G, components=None):
         # Conectar componentes desconectados
         print("Mejorando conectividad...")
         
-        components = self._find_components(G)
+        if components is None:
+            components = self._find_components(G)
         print(f"Componentes encontrados: {len(components)}")
         
         if len(components) <= 1:
@@ -119,112 +195,190 @@ class NetworkExtractor:
         components = sorted(components, key=len, reverse=True)
         main_component = components[0]
         
+        # Nodos con coordenadas como arreglos ordenados por ID: cada componente se
+        # traduce a coordenadas con una búsqueda vectorizada, sin recorrer dicts
+        coords = self._get_coords(G)
+        all_nodes = np.fromiter(coords.keys(), dtype=np.int64, count=len(coords))
+        all_points = self._planar_coords(list(coords.values()))
+        order = np.argsort(all_nodes)
+        sorted_nodes = all_nodes[order]
+        sorted_points = all_points[order]
+        
+        main_nodes, main_points = self._component_points(main_component, sorted_nodes, sorted_points)
+        if len(main_nodes) == 0:
+            return
+        
+        # Puntos de todas las componentes candidatas en un solo arreglo;
+        # owner[k] es el índice (en components) de la componente del punto k
+        candidates = [self._component_points(component, sorted_nodes, sorted_points)
+                      for component in components[1:]]
+        sizes = np.array([len(nodes) for nodes, _ in candidates], dtype=np.int64)
+        if sizes.sum() == 0:
+            return
+        cand_nodes = np.concatenate([nodes for nodes, _ in candidates])
+        cand_points = np.concatenate([points for _, points in candidates])
+        owner = np.repeat(np.arange(1, len(components)), sizes)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        
+        # Mejor vecino conocido de cada punto candidato dentro de la componente
+        # principal (distancia plana y nodo del vecino)
+        best_dist, best_index = cKDTree(main_points).query(cand_points, k=1, workers=-1)
+        best_node = main_nodes[best_index]
+        nonempty = sizes > 0
+        pending = nonempty.copy()
+        
+        # Unir primero la componente más cercana; la principal crece con cada
+        # unión, así que las componentes en cadena se conectan a través de ella
         connections_added = 0
-        for component in components[1:]:
-            if connections_added >= 50:  # Límite de conexiones
+        while connections_added < 50 and pending.any():  # Límite de conexiones
+            comp_dist = np.full(len(sizes), np.inf)
+            comp_dist[nonempty] = np.minimum.reduceat(best_dist, starts[nonempty])
+            comp_dist[~pending] = np.inf
+            c = int(np.argmin(comp_dist))
+            k = starts[c] + int(np.argmin(best_dist[starts[c]:starts[c] + sizes[c]]))
+            node1 = int(best_node[k])
+            node2 = int(cand_nodes[k])
+            distance = self._calculate_distance(G, node1, node2)
+            if distance > 5000:  # Máximo 5km: las demás están aún más lejos
                 break
             
-            # Encontrar conexión más cercana
-            best_connection = self._find_best_connection(G, main_component, component)
+            G.add_edge(node1, node2, length=distance)
+            G.add_edge(node2, node1, length=distance)
+            connections_added += 1
             
-            if best_connection:
-                node1, node2, distance = best_connection
-                if distance <= 5000:  # Máximo 5km
-                    G.add_edge(node1, node2, length=distance)
-                    G.add_edge(node2, node1, length=distance)
-                    main_component.update(component)
-                    connections_added += 1
+            # Extender el conjunto de búsqueda con la componente recién unida:
+            # solo se consulta un KD-tree pequeño con sus puntos
+            pending[c] = False
+            if not pending.any():
+                break
+            pending_points = np.flatnonzero(pending[owner - 1])
+            merged = slice(starts[c], starts[c] + sizes[c])
+            self._extend_best(cand_points[merged], cand_nodes[merged],
+                              cand_points, pending_points, best_dist, best_node)
         
         print(f"Conexiones agregadas: {connections_added}")
     
-    def _find_best_connection(self, G, comp1, comp2):
-        # Encuentra la mejor conexión entre dos componentes
-        best_distance = float('inf')
-        best_connection = None
-        
-        # Muestrear para eficiencia
-        sample1 = random.sample(list(comp1), min(20, len(comp1)))
-        sample2 = random.sample(list(comp2), min(20, len(comp2)))
-        
-        for node1 in sample1:
-            for node2 in sample2:
-                distance = self._calculate_distance(G, node1, node2)
-                if distance < best_distance:
-                    best_distance = distance
-                    best_connection = (node1, node2, distance)
-        
-        return best_connection
+    def _extend_best(self, merged_points, merged_nodes, cand_points,
+                     pending_points, best_dist, best_node):
+        # Actualiza el vecino más cercano de los puntos pendientes con los nodos
+        # de una componente que acaba de unirse a la principal
+        distances, indices = cKDTree(merged_points).query(cand_points[pending_points], k=1, workers=-1)
+        closer = distances < best_dist[pending_points]
+        targets = pending_points[closer]
+        best_dist[targets] = distances[closer]
+        best_node[targets] = merged_nodes[indices[closer]]
+    
+    def _component_points(self, component, sorted_nodes, sorted_points):
+        # IDs y coordenadas planas de los nodos de una componente que tienen coordenadas
+        nodes = np.asarray(component, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(sorted_nodes, nodes), len(sorted_nodes) - 1)
+        found = sorted_nodes[positions] == nodes
+        return nodes[found], sorted_points[positions[found]]
+    
+    def _planar_coords(self, points):
+        # Proyección equirectangular (lat, lon * cos(lat_ref)); a escala de Lima
+        # la distancia euclidiana es proporcional a la haversine
+        points = np.asarray(points, dtype=float)
+        return np.column_stack((points[:, 0], points[:, 1] * math.cos(REFERENCE_LAT)))
+    
+    def _coord_keys(self, G):
+        # Detectar una sola vez el esquema de coordenadas del grafo:
+        # OSMnx usa 'y'/'x'; otros grafos pueden traer 'lat'/'lon'
+        for _, data in G.nodes(data=True):
+            if 'y' in data:
+                return 'y', 'x'
+            if 'lat' in data:
+                return 'lat', 'lon'
+        return 'y', 'x'
+    
+    def _cache_coords(self, G):
+        # Precalcular {nodo: (lat_rad, lon_rad)} para los nodos con coordenadas
+        lat_key, lon_key = self._coord_keys(G)
+        coords = {}
+        for node, data in G.nodes(data=True):
+            lat = data.get(lat_key)
+            lon = data.get(lon_key)
+            if lat is not None and lon is not None:
+                coords[node] = (math.radians(lat), math.radians(lon))
+        self._coords_rad = coords
+        return coords
+    
+    def _get_coords(self, G):
+        if self._coords_rad is None:
+            return self._cache_coords(G)
+        return self._coords_rad
     
     def _calculate_distance(self, G, node1, node2):
         # Calcular distancia haversine entre nodos
-        try:
-            data1 = G.nodes[node1]
-            data2 = G.nodes[node2]
-            
-            lat1 = data1.get('y', data1.get('lat'))
-            lon1 = data1.get('x', data1.get('lon'))
-            lat2 = data2.get('y', data2.get('lat'))
-            lon2 = data2.get('x', data2.get('lon'))
-            
-            if None in [lat1, lon1, lat2, lon2]:
-                return float('inf')
-            
-            # Fórmula de haversine
-            R = 6371000  # Radio de la Tierra en metros
-            lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-            lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-            
-            dlat = lat2_rad - lat1_rad
-            dlon = lon2_rad - lon1_rad
-            
-            a = (math.sin(dlat/2)**2 + 
-                 math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2)
-            
-            distance = 2 * R * math.asin(math.sqrt(a))
-            return distance
-            
-        except Exception:
+        coords = self._get_coords(G)
+        if node1 not in coords or node2 not in coords:
             return float('inf')
+        
+        lat1_rad, lon1_rad = coords[node1]
+        lat2_rad, lon2_rad = coords[node2]
+        return _haversine_m(lat1_rad, lon1_rad, lat2_rad, lon2_rad)
     
-    def _to_dataframes(self, G):
-        # Convertir grafo a DataFrames
-        print("Convirtiendo a DataFrames...")
+    def _to_tables(self, G):
+        # Convertir grafo a tablas {columna: arreglo}
+        print("Convirtiendo a tablas...")
         
-        # Nodos
-        nodes_data = []
-        node_mapping = {}
+        # Nodos: llenar arreglos preasignados en lugar de una lista de dicts
+        n = G.number_of_nodes()
+        osm_ids = np.empty(n, dtype=np.int64)
+        lats = np.full(n, np.nan)
+        lons = np.full(n, np.nan)
+        lat_key, lon_key = self._coord_keys(G)
         
         for idx, (node_id, data) in enumerate(G.nodes(data=True)):
-            lat = data.get('y', data.get('lat'))
-            lon = data.get('x', data.get('lon'))
+            osm_ids[idx] = node_id
+            lat = data.get(lat_key)
+            lon = data.get(lon_key)
             
             if lat is not None and lon is not None:
-                nodes_data.append({
-                    'node_id': idx,
-                    'osm_id': node_id,
-                    'lat': lat,
-                    'lon': lon
-                })
-                node_mapping[node_id] = idx
+                lats[idx] = lat
+                lons[idx] = lon
+        
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        node_ids = np.arange(n)[valid]
         
-        nodes_df = pd.DataFrame(nodes_data)
+        nodes = {
+            'node_id': node_ids,
+            'osm_id': osm_ids[valid],
+            'lat': lats[valid],
+            'lon': lons[valid]
+        }
+        node_mapping = dict(zip(osm_ids[valid].tolist(), node_ids.tolist()))
         
         # Aristas
-        edges_data = []
+        m = G.number_of_edges()
+        node1 = np.empty(m, dtype=np.int64)
+        node2 = np.empty(m, dtype=np.int64)
+        # float32 basta para longitudes en metros (precisión submilimétrica);
+        # lat/lon se mantienen en float64 porque float32 pierde ~1 m a -77°
+        distances = np.empty(m, dtype=np.float32)
+        count = 0
+        
         for u, v, data in G.edges(data=True):
-            if u in node_mapping and v in node_mapping:
-                length = data.get('length', 100.0)
-                if length <= 0:
-                    length = self._calculate_distance(G, u, v)
-                    if length == float('inf'):
-                        length = 100.0
-                
-                edges_data.append({
-                    'node1': node_mapping[u],
-                    'node2': node_mapping[v],
-                    'distance': length
-                })
-        
-        edges_df = pd.DataFrame(edges_data)
-        
-        return nodes_df, edges_df
\ No newline at end of file
+            i = node_mapping.get(u)
+            j = node_mapping.get(v)
+            if i is None or j is None:
+                continue
+            
+            length = data.get('length', 100.0)
+            if length <= 0:
+                length = self._calculate_distance(G, u, v)
+                if length == float('inf'):
+                    length = 100.0
+            
+            node1[count] = i
+            node2[count] = j
+            distances[count] = length
+            count += 1
+        
+        edges = {
+            'node1': node1[:count],
+            'node2': node2[:count],
+            'distance': distances[:count]
+        }
+        
+        return nodes, edges
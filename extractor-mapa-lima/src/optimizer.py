@@ -4,68 +4,147 @@ Optimizer
 Contiene funciones para exportar grafos y generar visualizaciones
 """
 import pandas as pd
+import numpy as np
 import json
 import random
+from collections import deque
 import folium
+from folium.plugins import FastMarkerCluster
+
+try:
+    import pyarrow.csv as pcsv
+except ImportError:
+    # pyarrow es opcional: sin él se usa pd.read_csv
+    pcsv = None
+
+try:
+    import orjson
+except ImportError:
+    # orjson es opcional: sin él se usa el módulo json estándar
+    orjson = None
+
+# Dibuja cada nodo como CircleMarker dentro del cluster (fila = [lat, lon, id])
+NODE_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 3, color: 'blue', fill: true, fillOpacity: 0.7});
+    marker.bindPopup('Nodo: ' + row[2]);
+    return marker;
+}
+"""
 
 class GraphExporter:
     """Exportador de grafos para visualización"""
     
+    # Vecinos encolados por nodo al muestrear el subgrafo conectado
+    FANOUT = 4
+    
+    # Tamaño de bloque al leer aristas (bytes con pyarrow, filas con pandas)
+    EDGE_BLOCK_BYTES = 16 << 20
+    EDGE_CHUNK_ROWS = 1_000_000
+    
     def __init__(self, nodes_file, edges_file):
         self.nodes_file = nodes_file
         self.edges_file = edges_file
         self.nodes_df = None
         self.edges_df = None
         self.graph = None
+        self._coord_map = None
         self._load_data()
     
     def _load_data(self):
         # Cargar datos de red
         try:
-            self.nodes_df = pd.read_csv(self.nodes_file)
-            self.edges_df = pd.read_csv(self.edges_file)
+            self.nodes_df = self._read_csv(self.nodes_file)
             self.nodes_df.columns = self.nodes_df.columns.str.strip()
-            self.edges_df.columns = self.edges_df.columns.str.strip()
-            print(f"Red cargada: {len(self.nodes_df)} nodos, {len(self.edges_df)} aristas")
             self._build_graph()
+            self.edges_df = self._read_edges()
+            print(f"Red cargada: {len(self.nodes_df)} nodos, {len(self.edges_df)} aristas")
+            self._build_coord_map()
         except FileNotFoundError:
             raise FileNotFoundError("Archivos de red no encontrados")
         except Exception as e:
             raise Exception(f"Error cargando red: {str(e)}")
     
-    def _build_graph(self):
-        # Construir grafo de adyacencia
-        self.graph = {int(row['node_id']): [] for _, row in self.nodes_df.iterrows()}
+    def _read_csv(self, path):
+        # Lector CSV multihilo de pyarrow; convierte a pandas liberando la tabla Arrow
+        if pcsv is None:
+            return pd.read_csv(path)
+        table = pcsv.read_csv(path)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    
+    def _iter_edge_batches(self):
+        # Leer aristas por bloques: (node1, node2, distance) como arreglos NumPy
+        if pcsv is None:
+            for chunk in pd.read_csv(self.edges_file, chunksize=self.EDGE_CHUNK_ROWS):
+                chunk.columns = chunk.columns.str.strip()
+                yield (chunk['node1'].to_numpy(dtype=np.int64),
+                       chunk['node2'].to_numpy(dtype=np.int64),
+                       chunk['distance'].to_numpy(dtype=np.float64))
+            return
         
-        for _, row in self.edges_df.iterrows():
-            u = int(row['node1'])
-            v = int(row['node2'])
-            weight = float(row['distance'])
-            
+        read_options = pcsv.ReadOptions(block_size=self.EDGE_BLOCK_BYTES)
+        for batch in pcsv.open_csv(self.edges_file, read_options=read_options):
+            columns = {name.strip(): i for i, name in enumerate(batch.schema.names)}
+            yield tuple(
+                batch.column(columns[name]).to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+                for name, dtype in (('node1', np.int64), ('node2', np.int64), ('distance', np.float64))
+            )
+    
+    def _read_edges(self):
+        # Construir la adyacencia bloque a bloque; solo se conservan las 3 columnas usadas
+        node1_parts, node2_parts, distance_parts = [], [], []
+        for node1, node2, distances in self._iter_edge_batches():
+            self._add_edges(node1, node2, distances)
+            node1_parts.append(node1)
+            node2_parts.append(node2)
+            distance_parts.append(distances)
+        
+        return pd.DataFrame({
+            'node1': np.concatenate(node1_parts) if node1_parts else np.empty(0, dtype=np.int64),
+            'node2': np.concatenate(node2_parts) if node2_parts else np.empty(0, dtype=np.int64),
+            'distance': np.concatenate(distance_parts) if distance_parts else np.empty(0, dtype=np.float64),
+        })
+    
+    def _build_graph(self):
+        # Grafo de adyacencia vacío; las aristas se agregan al leer cada bloque
+        node_ids = self.nodes_df['node_id'].to_numpy(dtype=np.int64)
+        self.graph = {node: [] for node in node_ids.tolist()}
+    
+    def _add_edges(self, node1, node2, distances):
+        # Agregar un bloque de aristas desde columnas NumPy (sin iterrows)
+        for u, v, weight in zip(node1.tolist(), node2.tolist(), distances.tolist()):
             if u in self.graph:
                 self.graph[u].append((v, weight))
             if v in self.graph:
                 self.graph[v].append((u, weight))
     
+    def _build_coord_map(self):
+        # Indice node_id -> (lat, lon) para consultas O(1) al dibujar mapas
+        self._coord_map = dict(zip(self.nodes_df['node_id'].astype(int).tolist(),
+                                   zip(self.nodes_df['lat'].astype(float).tolist(),
+                                       self.nodes_df['lon'].astype(float).tolist())))
+    
     def export_for_graphviz(self, filename_prefix="graph", mode="reduced", target_nodes=1500):
         """Exportar grafo a formato DOT y JSON"""
         
-        # Determinar nodos conectados
-        nodes_in_edges = set()
-        for _, row in self.edges_df.iterrows():
-            try:
-                u = int(row['node1'])
-                v = int(row['node2'])
-            except:
-                continue
-            nodes_in_edges.add(u)
-            nodes_in_edges.add(v)
+        # Columnas de aristas extraídas una sola vez para todo el método
+        node1 = self.edges_df['node1'].to_numpy(dtype=np.int64)
+        node2 = self.edges_df['node2'].to_numpy(dtype=np.int64)
+        distances = self.edges_df['distance'].to_numpy(dtype=np.float64)
+        
+        # Determinar nodos conectados (pd.unique usa hash, sin ordenar como np.unique)
+        nodes_in_edges = set(pd.unique(np.concatenate([node1, node2])).tolist())
         
         # Seleccionar subconjunto de nodos según el modo
         if mode == "reduced" and len(nodes_in_edges) > target_nodes:
             selected_nodes = self._select_connected_subgraph(nodes_in_edges, target_nodes)
+            selected_arr = np.fromiter(selected_nodes, dtype=np.int64, count=len(selected_nodes))
+            inside = np.isin(node1, selected_arr) & np.isin(node2, selected_arr)
         else:
+            # Todos los extremos de arista están seleccionados: no hace falta filtrar
             selected_nodes = nodes_in_edges
+            inside = np.ones(len(node1), dtype=bool)
         
         print(f"Exportando {len(selected_nodes)} nodos...")
         
@@ -79,16 +158,21 @@ class GraphExporter:
             f.write("  node [shape=circle, style=filled, fillcolor=lightblue];\n")
             f.write("  edge [color=gray];\n")
             
-            # Escribir aristas
-            written_edges = set()
-            for _, row in self.edges_df.iterrows():
-                u, v = int(row['node1']), int(row['node2'])
-                if u in selected_nodes and v in selected_nodes:
-                    edge_key = tuple(sorted([u, v]))
-                    if edge_key not in written_edges:
-                        weight = int(row['distance'])
-                        f.write(f"  {u} -- {v} [label=\"{weight}m\", weight={weight}];\n")
-                        written_edges.add(edge_key)
+            # Escribir aristas: deduplicado vectorizado
+            # Clave de arista no dirigida: (min << 32) | max
+            low = np.minimum(node1, node2).astype(np.uint64)
+            high = np.maximum(node1, node2).astype(np.uint64)
+            keys = (low << np.uint64(32)) | high
+            
+            # Primera aparicion de cada clave, en el orden original del CSV
+            _, first = np.unique(keys[inside], return_index=True)
+            rows = np.flatnonzero(inside)[np.sort(first)]
+            weights = distances[rows].astype(np.int64)
+            
+            f.writelines(
+                f"  {u} -- {v} [label=\"{weight}m\", weight={weight}];\n"
+                for u, v, weight in zip(node1[rows].tolist(), node2[rows].tolist(), weights.tolist())
+            )
             
             f.write("}\n")
         
@@ -101,8 +185,13 @@ class GraphExporter:
                     if neighbor in selected_nodes:
                         adjacency[str(node)].append({str(neighbor): weight})
         
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(adjacency, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            # Serializador en C; escribe bytes directamente con la misma indentación
+            with open(json_path, 'wb') as f:
+                f.write(orjson.dumps(adjacency, option=orjson.OPT_INDENT_2))
+        else:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(adjacency, f, indent=2, ensure_ascii=False)
         
         print(f"Archivos generados:")
         print(f"  {dot_path} - Archivo DOT para Graphviz")
@@ -118,22 +207,23 @@ class GraphExporter:
         # Comenzar desde un nodo aleatorio
         start_node = random.choice(list(nodes_set))
         selected = set()
-        queue = [start_node]
+        queue = deque([start_node])
         
-        while queue and len(selected) < target_nodes:
-            node = queue.pop(0)
+        while queue:
+            node = queue.popleft()
             if node in selected:
                 continue
             
             selected.add(node)
+            if len(selected) >= target_nodes:
+                break
             
-            # Agregar vecinos no visitados
+            # Agregar hasta FANOUT vecinos no visitados, elegidos al azar para diversidad
             if node in self.graph:
-                neighbors = [neighbor for neighbor, _ in self.graph[node]]
-                random.shuffle(neighbors)  # Aleatorizar para diversidad
-                for neighbor in neighbors:
-                    if neighbor in nodes_set and neighbor not in selected and len(selected) < target_nodes:
-                        queue.append(neighbor)
+                neighbors = [neighbor for neighbor, _ in self.graph[node]
+                             if neighbor in nodes_set and neighbor not in selected]
+                for neighbor in random.sample(neighbors, min(len(neighbors), self.FANOUT)):
+                    queue.append(neighbor)
         
         return selected
     
@@ -144,24 +234,25 @@ class GraphExporter:
             json_file += '.json'
         
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                adjacency = json.load(f)
+            if orjson is not None:
+                with open(json_file, 'rb') as f:
+                    adjacency = orjson.loads(f.read())
+            else:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    adjacency = json.load(f)
         except FileNotFoundError:
             print(f"Archivo JSON no encontrado: {json_file}")
             return False
         
-        # Obtener coordenadas de nodos
+        # Obtener coordenadas de nodos desde el indice precalculado
         coords = {}
         for node_str in adjacency.keys():
             try:
                 nid = int(node_str)
-                row = self.nodes_df[self.nodes_df['node_id'] == nid]
-                if not row.empty:
-                    lat = float(row.iloc[0]['lat'])
-                    lon = float(row.iloc[0]['lon'])
-                    coords[node_str] = (lat, lon)
-            except:
+            except ValueError:
                 continue
+            if nid in self._coord_map:
+                coords[node_str] = self._coord_map[nid]
         
         if not coords:
             print("No se encontraron coordenadas para los nodos")
@@ -175,13 +266,14 @@ class GraphExporter:
         # Generar mapa con folium
         route_map = folium.Map(location=center, zoom_start=12, tiles='OpenStreetMap')
         
-        # Dibujar aristas
+        # Dibujar aristas: una sola polilinea multiple en lugar de una por arista
         drawn_edges = set()
+        all_lines = []
         for u_str, neighbors in adjacency.items():
             if u_str not in coords:
                 continue
             for neighbor_data in neighbors:
-                for v_str, weight in neighbor_data.items():
+                for v_str in neighbor_data:
                     if v_str not in coords:
                         continue
                     
@@ -189,26 +281,24 @@ class GraphExporter:
                     if edge_key in drawn_edges:
                         continue
                     drawn_edges.add(edge_key)
-                    
-                    lat1, lon1 = coords[u_str]
-                    lat2, lon2 = coords[v_str]
-                    folium.PolyLine(
-                        locations=[(lat1, lon1), (lat2, lon2)],
-                        color='blue',
-                        weight=2,
-                        opacity=0.8
-                    ).add_to(route_map)
-        
-        # Agregar marcadores para nodos
-        for nid, (lat, lon) in coords.items():
-            folium.CircleMarker(
-                location=(lat, lon),
-                radius=3,
+                    all_lines.append([coords[u_str], coords[v_str]])
+        
+        edges_layer = folium.FeatureGroup(name='Aristas')
+        if all_lines:
+            folium.PolyLine(
+                locations=all_lines,
                 color='blue',
-                fill=True,
-                fillOpacity=0.7,
-                popup=f"Nodo: {nid}"
-            ).add_to(route_map)
+                weight=2,
+                opacity=0.8
+            ).add_to(edges_layer)
+        edges_layer.add_to(route_map)
+        
+        # Agregar marcadores para nodos (agrupados, se crean en el navegador)
+        FastMarkerCluster(
+            data=[[lat, lon, nid] for nid, (lat, lon) in coords.items()],
+            callback=NODE_MARKER_CALLBACK,
+            name='Nodos'
+        ).add_to(route_map)
         
         # Guardar mapa
         map_path = json_file.replace('.json', '_map.html')
@@ -10,8 +10,33 @@ Implementa: Held-Karp (TSP exacto con DP), Dijkstra (Búsqueda en Grafos)
 """
 
 import heapq
-from typing import List, Tuple, Dict, Set
-from itertools import combinations
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Set, Optional
+import numpy as np
+from .dijkstra_numba import NUMBA_DISPONIBLE, astar_csr, dijkstra_csr, haversine_m
+from .held_karp_numba import held_karp_dp
+
+# Hasta este numero de destinos la tabla en Python puro (enteros como mascara)
+# es mas rapida que la version NumPy, cuyo costo fijo por capa domina
+MAX_DESTINOS_DP_PYTHON = 5
+
+# Sin numba la tabla de Held-Karp pasa del segundo por encima de este numero de
+# destinos; entonces un recorrido previo se repara en lugar de resolver de cero
+MAX_DESTINOS_EXACTO_PYTHON = 16
+
+# Pasadas de 2-opt al reparar un recorrido previo con un destino de diferencia
+MAX_PASADAS_REPARACION = 3
+
+# Matrices entre nodos de interes que se conservan (LRU) para no repetir los
+# Dijkstra cuando se recalcula la ruta con los mismos nodos
+MAX_MATRICES_CACHE = 4
+
+# Nodos de interes cuyas distancias y arboles se conservan entre calculos en
+# grafos simetricos: un nodo nuevo solo necesita un Dijkstra hacia los demas
+MAX_NODOS_POOL = 48
 
 
 class CalculadorRutas:
@@ -19,17 +44,110 @@ class CalculadorRutas:
     Clase para calcular rutas optimas usando programacion dinamica y algoritmos de grafos
     """
     
-    def __init__(self, grafo: Dict[int, Dict[int, float]], factor_trafico: float = 1.0):
+    def __init__(self, grafo: Dict[int, Dict[int, float]], factor_trafico: float = 1.0,
+                 nodos_coords: Optional[Dict[int, Tuple[float, float]]] = None):
         """
         Args:
             grafo: Diccionario de adyacencia {nodo: {vecino: peso}}
             factor_trafico: Factor multiplicador por trafico (1.0 a 2.5)
+            nodos_coords: Diccionario {nodo_id: (lat, lon)}; si cubre todos los
+                nodos, las consultas origen-destino usan A* en vez de Dijkstra
         """
         self.grafo = grafo
         self.nodos = list(grafo.keys())
         self.matriz_distancias = {}
+        self.matriz_densa = np.zeros((0, 0))
+        self.indice_interes = {}
+        self.padres_interes = {}
+        self.rango_interes = None
+        # True si el ultimo calcular_ruta_tsp reparo un recorrido previo en lugar
+        # de resolver el TSP exacto (el resultado puede mejorarse con 2-opt)
+        self.tsp_heuristico = False
         self.precalculado = False
+        self._cache_matrices: OrderedDict = OrderedDict()
+        self._simetrico: Optional[bool] = None
+        # Pool incremental: rango = orden de llegada; el arbol de cada nodo cubre
+        # a todos los que llegaron antes, y _pool_dist[a][b] es simetrica
+        self._pool_rango: Dict[int, int] = {}
+        self._pool_arboles: Dict[int, object] = {}
+        self._pool_dist: Dict[int, Dict[int, float]] = {}
+        self._contador_pool = 0
         self.factor_trafico = factor_trafico
+        self._construir_csr()
+        self._preparar_astar(nodos_coords)
+    
+    def _construir_csr(self):
+        """
+        Convierte el diccionario de adyacencia a formato CSR (Compressed Sparse Row)
+        
+        Los vecinos del nodo con indice u estan en indices[indptr[u]:indptr[u + 1]]
+        y sus pesos en las mismas posiciones de pesos. El factor de trafico se
+        aplica una sola vez aqui en lugar de en cada relajacion de Dijkstra.
+        """
+        self.nodo_a_indice = {nodo: i for i, nodo in enumerate(self.nodos)}
+
+        # Una sola pasada por el diccionario: grados, vecinos y pesos a la vez
+        grados = []
+        vecinos = []
+        pesos = []
+        for nodo in self.nodos:
+            adyacentes = self.grafo[nodo]
+            grados.append(len(adyacentes))
+            vecinos.extend(adyacentes)
+            pesos.extend(adyacentes.values())
+
+        self.indptr = np.zeros(len(self.nodos) + 1, dtype=np.int64)
+        np.cumsum(grados, out=self.indptr[1:])
+        self.indices = np.fromiter(map(self.nodo_a_indice.__getitem__, vecinos),
+                                   dtype=np.int32, count=len(vecinos))
+        self.pesos = np.array(pesos, dtype=np.float64)
+        # Pesos con trafico en float32: la mitad de bytes por arista en los bucles
+        # de Dijkstra/A*. Las distancias se siguen acumulando en float64, asi que
+        # el error es solo el redondeo de cada arista (submilimetrico en Lima)
+        self.pesos_trafico = (self.pesos * self.factor_trafico).astype(np.float32)
+        
+        # Copias como listas: indexar listas es mas rapido que indexar arrays
+        # numpy elemento a elemento desde Python
+        self._indptr_lista = self.indptr.tolist()
+        self._indices_lista = self.indices.tolist()
+        self._pesos_trafico_lista = self.pesos_trafico.tolist()
+        
+        # Buffers reutilizados por _dijkstra_python: en cada llamada solo se
+        # restauran los nodos tocados por la anterior en vez de crear listas de V
+        self._dist_scratch = [float('inf')] * len(self.nodos)
+        self._padres_scratch = [-1] * len(self.nodos)
+        self._tocados: List[int] = []
+    
+    def _preparar_astar(self, nodos_coords: Optional[Dict[int, Tuple[float, float]]]):
+        """
+        Prepara las coordenadas (radianes, por indice CSR) y la escala de la
+        heuristica de A*: el menor cociente peso / distancia en linea recta
+        entre todas las aristas, para que la heuristica nunca sobreestime
+        
+        Args:
+            nodos_coords: Diccionario {nodo_id: (lat, lon)} o None
+        """
+        self.usar_astar = False
+        if not nodos_coords or any(nodo not in nodos_coords for nodo in self.nodos):
+            return
+        
+        coords = np.radians(np.array([nodos_coords[nodo] for nodo in self.nodos], dtype=np.float64).reshape(-1, 2))
+        self.lat_rad = np.ascontiguousarray(coords[:, 0])
+        self.lon_rad = np.ascontiguousarray(coords[:, 1])
+        
+        # Nodo de salida de cada arista CSR
+        salida = np.repeat(np.arange(len(self.nodos)), np.diff(self.indptr))
+        recta = haversine_m(self.lat_rad[salida], self.lon_rad[salida],
+                            self.lat_rad[self.indices], self.lon_rad[self.indices])
+        con_longitud = recta > 0
+        if not con_longitud.any():
+            return
+        
+        # Margen relativo para absorber el redondeo de punto flotante
+        self.escala_heuristica = float(np.min(self.pesos_trafico[con_longitud] / recta[con_longitud])) * (1 - 1e-9)
+        self.usar_astar = self.escala_heuristica > 0
+        self._lat_rad_lista = self.lat_rad.tolist()
+        self._lon_rad_lista = self.lon_rad.tolist()
     
     def dijkstra(self, origen: int, destino: int) -> Tuple[float, List[int]]:
         """
@@ -39,7 +157,7 @@ class CalculadorRutas:
         
         Componentes de Búsqueda en Grafos:
         - Cola de prioridad para exploración eficiente
-        - Set de visitados para evitar ciclos
+        - Descarte de entradas obsoletas del heap (sin set de visitados)
         - Reconstrucción de camino mediante punteros
         
         Args:
@@ -52,73 +170,362 @@ class CalculadorRutas:
         if origen not in self.grafo or destino not in self.grafo:
             return float('inf'), []
         
-        distancias = {nodo: float('inf') for nodo in self.grafo}
-        distancias[origen] = 0
-        padres = {}
-        visitados = set()
-        heap: List[Tuple[float, int]] = [(0.0, origen)]
+        inicio = self.nodo_a_indice[origen]
+        fin = self.nodo_a_indice[destino]
+        if self.usar_astar:
+            # Con coordenadas, A* expande muchos menos nodos para un solo destino
+            distancias, padres = self._astar_indices(inicio, fin)
+        else:
+            distancias, padres = self._dijkstra_indices(inicio, [fin])
+        
+        #  RECONSTRUCCIÓN DE CAMINO 
+        if distancias[fin] == float('inf'):
+            return float('inf'), []
+        
+        return float(distancias[fin]), self._reconstruir_camino(padres, fin)
+    
+    def _reconstruir_camino(self, padres, fin: int) -> List[int]:
+        """
+        BACKTRACKING: Reconstruye camino desde destino hasta origen
+        
+        Args:
+            padres: Arbol de padres indexado por CSR (-1 en el origen)
+            fin: Indice del nodo final
+            
+        Returns:
+            Lista de nodos desde el origen hasta el destino
+        """
+        camino = []
+        actual = fin
+        while actual != -1:
+            camino.append(self.nodos[actual])
+            actual = int(padres[actual])  # Sigue punteros hacia atrás
+        camino.reverse()
+        return camino
+    
+    def dijkstra_multi_target(self, origen: int, destinos: List[int]) -> Dict[int, float]:
+        """
+        Calcula en un solo recorrido de Dijkstra las distancias desde origen a
+        varios destinos; la busqueda termina cuando todos quedan fijados
+        
+        Args:
+            origen: Nodo inicial
+            destinos: Nodos cuya distancia se necesita
+            
+        Returns:
+            Diccionario {destino: distancia} (inf si no es alcanzable)
+        """
+        resultado, _ = self._recorrido_multi_target(origen, destinos)
+        return resultado
+    
+    def _recorrido_multi_target(self, origen: int, destinos: List[int]):
+        """
+        Igual que dijkstra_multi_target, pero tambien retorna el arbol de padres
+        (indexado por CSR) del recorrido, valido para los destinos fijados
+        
+        Args:
+            origen: Nodo inicial
+            destinos: Nodos cuya distancia se necesita
+            
+        Returns:
+            Tupla ({destino: distancia}, padres); padres es None si origen no existe
+        """
+        resultado = {destino: float('inf') for destino in destinos}
+        if origen not in self.grafo:
+            return resultado, None
+        
+        indices_destino = [self.nodo_a_indice[d] for d in resultado if d in self.grafo]
+        distancias, padres = self._dijkstra_indices(self.nodo_a_indice[origen], indices_destino)
+        
+        for destino in resultado:
+            if destino in self.grafo:
+                resultado[destino] = float(distancias[self.nodo_a_indice[destino]])
+        
+        if not NUMBA_DISPONIBLE:
+            # Los buffers de Python se reutilizan: copiar solo los padres tocados
+            padres = {i: padres[i] for i in self._tocados}
+        return resultado, padres
+    
+    def _dijkstra_indices(self, inicio: int, destinos: List[int]):
+        """
+        Ejecuta Dijkstra sobre indices CSR con el nucleo disponible
+        
+        Args:
+            inicio: Indice del nodo inicial
+            destinos: Indices de los nodos que deben quedar fijados
+            
+        Returns:
+            Tupla (distancias, padres) indexadas por nodo
+        """
+        if NUMBA_DISPONIBLE:
+            # Bucle compilado a codigo nativo sobre los arrays CSR
+            return dijkstra_csr(self.indptr, self.indices, self.pesos_trafico,
+                                inicio, np.asarray(destinos, dtype=np.int32))
+        return self._dijkstra_python(inicio, destinos)
+    
+    def _astar_indices(self, inicio: int, fin: int):
+        """
+        Ejecuta A* sobre indices CSR con el nucleo disponible
+        
+        Args:
+            inicio: Indice del nodo inicial
+            fin: Indice del nodo final
+            
+        Returns:
+            Tupla (distancias, padres) indexadas por nodo
+        """
+        if NUMBA_DISPONIBLE:
+            return astar_csr(self.indptr, self.indices, self.pesos_trafico,
+                             self.lat_rad, self.lon_rad, self.escala_heuristica, inicio, fin)
+        return self._astar_python(inicio, fin)
+    
+    def _astar_python(self, inicio: int, fin: int) -> Tuple[List[float], List[int]]:
+        """
+        A* en Python puro sobre los arrays CSR (respaldo sin numba)
+        
+        Args:
+            inicio: Indice del nodo inicial
+            fin: Indice del nodo final
+            
+        Returns:
+            Tupla (distancias, padres); solo distancias[fin] es definitiva
+        """
+        indptr = self._indptr_lista
+        indices = self._indices_lista
+        pesos = self._pesos_trafico_lista
+        lat = self._lat_rad_lista
+        lon = self._lon_rad_lista
+        lat_fin, lon_fin = lat[fin], lon[fin]
+        cos_lat_fin = math.cos(lat_fin)
+        escala = self.escala_heuristica * 2 * 6371000.0
+        
+        def heuristica(nodo: int) -> float:
+            sin_dlat = math.sin((lat_fin - lat[nodo]) / 2)
+            sin_dlon = math.sin((lon_fin - lon[nodo]) / 2)
+            a = sin_dlat * sin_dlat + math.cos(lat[nodo]) * cos_lat_fin * sin_dlon * sin_dlon
+            return escala * math.asin(math.sqrt(min(a, 1.0)))
+        
+        distancias = [float('inf')] * len(self.nodos)
+        distancias[inicio] = 0
+        padres = [-1] * len(self.nodos)
+        cerrados = [False] * len(self.nodos)
+        heap: List[Tuple[float, int]] = [(heuristica(inicio), inicio)]
         
-        #  BÚSQUEDA EN GRAFOS: EXPLORACIÓN DE NODOS 
         while heap:
-            dist_actual, actual = heapq.heappop(heap)  # Extrae nodo con menor distancia
+            _, actual = heapq.heappop(heap)  # Extrae nodo con menor g + h
             
-            if actual in visitados:
+            if cerrados[actual]:
                 continue
+            cerrados[actual] = True
             
-            visitados.add(actual)  #Marca nodo como visitado
+            if actual == fin:
+                break
             
-            if actual == destino:
-                break  # Terminación anticipada al encontrar destino
+            dist_actual = distancias[actual]
+            for k in range(indptr[actual], indptr[actual + 1]):
+                vecino = indices[k]
+                if cerrados[vecino]:
+                    continue
+                nueva_dist = dist_actual + pesos[k]
+                if nueva_dist < distancias[vecino]:
+                    distancias[vecino] = nueva_dist
+                    padres[vecino] = actual
+                    heapq.heappush(heap, (nueva_dist + heuristica(vecino), vecino))
+        
+        return distancias, padres
+    
+    def _dijkstra_python(self, inicio: int, destinos: List[int]) -> Tuple[List[float], List[int]]:
+        """
+        Dijkstra en Python puro sobre los arrays CSR (respaldo sin numba)
+        
+        Args:
+            inicio: Indice del nodo inicial
+            destinos: Indices de los nodos que deben quedar fijados
             
+        Returns:
+            Tupla (distancias, padres) indexadas por nodo; son los buffers
+            compartidos, validos solo hasta la siguiente llamada
+        """
+        indptr = self._indptr_lista
+        indices = self._indices_lista
+        pesos = self._pesos_trafico_lista
+        
+        distancias = self._dist_scratch
+        padres = self._padres_scratch
+        tocados = self._tocados
+        for i in tocados:
+            distancias[i] = float('inf')
+            padres[i] = -1
+        tocados.clear()
+        
+        distancias[inicio] = 0
+        tocados.append(inicio)
+        pendientes = set(destinos)
+        heap: List[Tuple[float, int]] = [(0.0, inicio)]
+        
+        #  BÚSQUEDA EN GRAFOS: EXPLORACIÓN DE NODOS 
+        while heap:
+            dist_actual, actual = heapq.heappop(heap)  # Extrae nodo con menor distancia
+            
+            # Entrada obsoleta: el nodo ya se fijo con una distancia menor.
+            # Basta esta comprobacion, sin conjunto de visitados
             if dist_actual > distancias[actual]:
                 continue
             
-            #EXPLORACIÓN: Recorre vecinos del nodo actual
-            for vecino, peso in self.grafo.get(actual, {}).items():
-                # Aplicar factor de trafico al peso
-                peso_con_trafico = peso * self.factor_trafico
-                nueva_dist = distancias[actual] + peso_con_trafico
+            if actual in pendientes:
+                pendientes.discard(actual)
+                if not pendientes:
+                    break  # Terminación anticipada al fijar todos los destinos
+            
+            #EXPLORACIÓN: Recorre vecinos del nodo actual (rango CSR, peso ya con trafico)
+            for k in range(indptr[actual], indptr[actual + 1]):
+                vecino = indices[k]
+                nueva_dist = dist_actual + pesos[k]
+                dist_vecino = distancias[vecino]
                 
                 #Actualiza si se encuentra camino mejor
-                if nueva_dist < distancias[vecino]:
+                if nueva_dist < dist_vecino:
+                    if dist_vecino == float('inf'):
+                        tocados.append(vecino)
                     distancias[vecino] = nueva_dist
                     padres[vecino] = actual
                     heapq.heappush(heap, (nueva_dist, vecino))  # Agrega a cola de prioridad
         
-        #  RECONSTRUCCIÓN DE CAMINO 
-        if distancias[destino] == float('inf'):
-            return float('inf'), []
-        
-        #BACKTRACKING: Reconstruye camino desde destino hasta origen
-        camino = []
-        actual = destino
-        while actual is not None:
-            camino.append(actual)
-            actual = padres.get(actual)  # Sigue punteros hacia atrás
-        camino.reverse()
-        
-        return distancias[destino], camino
+        return distancias, padres
     
     def precalcular_matriz_distancias(self, nodos_interes: List[int]):
         """
         Precalcula matriz de distancias entre nodos de interes para optimizar Held-Karp
         
+        Ademas del diccionario matriz_distancias guarda la matriz densa
+        matriz_densa[k, k], cuyas filas/columnas siguen indice_interes, y el
+        arbol de padres de cada origen para reconstruir caminos sin recalcular.
+        
+        Los resultados de las ultimas MAX_MATRICES_CACHE listas de nodos se
+        conservan, asi que recalcular con los mismos nodos no repite los Dijkstra.
+        
         Args:
             nodos_interes: Lista de nodos (origen + destinos)
         """
+        unicos = list(dict.fromkeys(nodos_interes))
+        
+        # Mismos nodos en el mismo orden que un calculo reciente: reutilizarlo
+        clave = tuple(unicos)
+        if clave in self._cache_matrices:
+            self._cache_matrices.move_to_end(clave)
+            (self.indice_interes, self.matriz_densa, self.padres_interes,
+             self.rango_interes, self.matriz_distancias) = self._cache_matrices[clave]
+            self.precalculado = True
+            return
+        
+        self.indice_interes = {nodo: i for i, nodo in enumerate(unicos)}
+        
+        if self._grafo_simetrico():
+            # Solo los nodos que no estan en el pool ejecutan Dijkstra
+            self._ampliar_pool(unicos)
+            dist = self._pool_dist
+            self.matriz_densa = np.array([[dist[a].get(b, float('inf')) for b in unicos] for a in unicos],
+                                         dtype=np.float64).reshape(len(unicos), len(unicos))
+            self.padres_interes = {nodo: self._pool_arboles[nodo] for nodo in unicos
+                                   if self._pool_arboles[nodo] is not None}
+            self.rango_interes = {nodo: self._pool_rango[nodo] for nodo in unicos}
+        else:
+            # Un Dijkstra por origen obtiene las distancias a todos los demas nodos.
+            # Con numba el nucleo libera el GIL, asi que los origenes corren en paralelo
+            recorridos = self._recorridos([(i, unicos) for i in unicos])
+            
+            filas = [fila for fila, _ in recorridos]
+            self.padres_interes = {nodo: padres for nodo, (_, padres) in zip(unicos, recorridos)
+                                   if padres is not None}
+            self.rango_interes = None
+            
+            self.matriz_densa = np.array([[fila[j] for j in unicos] for fila in filas], dtype=np.float64).reshape(len(unicos), len(unicos))
+        np.fill_diagonal(self.matriz_densa, 0.0)
+        
         self.matriz_distancias = {}
+        for a, i in enumerate(unicos):
+            for b, j in enumerate(unicos):
+                self.matriz_distancias[(i, j)] = float(self.matriz_densa[a, b]) if i != j else 0
         
-        # Usar Dijkstra para cada par de nodos
-        for i in nodos_interes:
-            for j in nodos_interes:
-                if i != j:
-                    dist, _ = self.dijkstra(i, j)
-                    self.matriz_distancias[(i, j)] = dist
-                else:
-                    self.matriz_distancias[(i, j)] = 0
+        self._cache_matrices[clave] = (self.indice_interes, self.matriz_densa, self.padres_interes,
+                                       self.rango_interes, self.matriz_distancias)
+        if len(self._cache_matrices) > MAX_MATRICES_CACHE:
+            self._cache_matrices.popitem(last=False)
         
         self.precalculado = True
     
+    def _recorridos(self, trabajos: List[Tuple[int, List[int]]]) -> list:
+        """
+        Ejecuta _recorrido_multi_target para cada (origen, destinos); con numba
+        el nucleo libera el GIL y los origenes corren en paralelo
+        
+        Args:
+            trabajos: Lista de tuplas (origen, destinos)
+            
+        Returns:
+            Lista de tuplas ({destino: distancia}, padres) en el mismo orden
+        """
+        if NUMBA_DISPONIBLE and len(trabajos) > 1:
+            hilos = min(os.cpu_count() or 1, len(trabajos))
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                return list(pool.map(lambda t: self._recorrido_multi_target(*t), trabajos))
+        return [self._recorrido_multi_target(origen, destinos) for origen, destinos in trabajos]
+    
+    def _grafo_simetrico(self) -> bool:
+        """
+        True si cada arista tiene su inversa con el mismo peso (se calcula una
+        vez); entonces dist(a, b) = dist(b, a) y un camino sirve en ambos sentidos
+        """
+        if self._simetrico is None:
+            n = len(self.nodos)
+            salida = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+            directa = salida * n + self.indices
+            inversa = self.indices.astype(np.int64) * n + salida
+            orden_directa = np.argsort(directa, kind='stable')
+            orden_inversa = np.argsort(inversa, kind='stable')
+            self._simetrico = bool(
+                np.array_equal(directa[orden_directa], inversa[orden_inversa])
+                and np.array_equal(self.pesos_trafico[orden_directa], self.pesos_trafico[orden_inversa]))
+        return self._simetrico
+    
+    def _ampliar_pool(self, nodos: List[int]):
+        """
+        Agrega al pool los nodos que faltan: cada uno ejecuta un Dijkstra hacia
+        los que ya estaban (y los nuevos anteriores a el), de modo que agregar
+        un destino cuesta un recorrido en lugar de uno por nodo de interes
+        
+        Args:
+            nodos: Nodos de interes del calculo actual
+        """
+        nuevos = [nodo for nodo in nodos if nodo not in self._pool_rango]
+        if not nuevos:
+            return
+        
+        # Hacer lugar descartando los nodos mas antiguos que no se piden ahora
+        exceso = len(self._pool_rango) + len(nuevos) - MAX_NODOS_POOL
+        if exceso > 0:
+            pedidos = set(nodos)
+            for nodo in [n for n in self._pool_rango if n not in pedidos][:exceso]:
+                del self._pool_rango[nodo]
+                del self._pool_arboles[nodo]
+                for otro in self._pool_dist.pop(nodo):
+                    self._pool_dist[otro].pop(nodo, None)
+        
+        previos = list(self._pool_rango)
+        trabajos = [(nodo, previos + nuevos[:k]) for k, nodo in enumerate(nuevos)]
+        # El primer nodo de un pool vacio no tiene hacia donde ir: sin recorrido
+        recorridos = self._recorridos([t for t in trabajos if t[1]])
+        if not trabajos[0][1]:
+            recorridos.insert(0, ({}, None))
+        
+        for nodo, (fila, padres) in zip(nuevos, recorridos):
+            self._contador_pool += 1
+            self._pool_rango[nodo] = self._contador_pool
+            self._pool_arboles[nodo] = padres
+            self._pool_dist[nodo] = fila
+            for otro, d in fila.items():
+                self._pool_dist[otro][nodo] = d
+    
     def held_karp(self, origen: int, destinos: List[int], retornar_origen: bool = True) -> Tuple[float, List[int]]:
         """
          TÉCNICA: PROGRAMACIÓN DINÁMICA 
@@ -130,7 +537,7 @@ class CalculadorRutas:
         2. MEMORIZACIÓN: Almacena soluciones parciales en tabla dp para evitar recálculos
         3. RECONSTRUCCIÓN: Usa backtracking para obtener la secuencia óptima
         
-        Complejidad: O(n^2 * 2^n) - Estados: (subconjunto, último_nodo)
+        Complejidad: O(n^2 * 2^n) - Estados: (mascara de bits, último_nodo)
         Factible para n <= 20
         
         Args:
@@ -150,79 +557,32 @@ class CalculadorRutas:
             self.precalcular_matriz_distancias(nodos_interes)
         
         n = len(destinos)
-        destinos_set = set(destinos)
+        
+        # Matriz local: filas/columnas 0..n-1 son los destinos y n es el origen
+        D = self._matriz_local(destinos + [origen])
         
         #  PROGRAMACIÓN DINÁMICA: TABLA DE MEMORIZACIÓN 
-        # Estado: dp[subconjunto][ultimo_nodo] = (distancia_minima, nodo_previo)
-        # - subconjunto: frozenset de destinos visitados (permite usar como clave)
-        # - ultimo_nodo: último destino visitado en el subconjunto
-        # - distancia_minima: menor distancia para llegar a ese estado
-        # - nodo_previo: nodo previo en la ruta óptima (para reconstrucción)
-        dp = {}
+        dp_dist, dp_prev = self._tabla_held_karp(D, n)
         
-        #CASO BASE: Ir desde origen a cada destino individualmente
-        for i, destino in enumerate(destinos):
-            subconjunto = frozenset([destino])
-            dist = self.matriz_distancias.get((origen, destino), float('inf'))
-            dp[(subconjunto, destino)] = (dist, origen)  # Memoriza caso base
+        # Encontrar solucion optima: en un ciclo cerrado el ultimo destino se
+        # elige sumando tambien el tramo de regreso al origen
+        todos = (1 << n) - 1
+        costo_final = dp_dist[todos] + D[:n, n] if retornar_origen else dp_dist[todos]
+        mejor_ultimo = int(np.argmin(costo_final))
+        mejor_dist_total = float(costo_final[mejor_ultimo])
         
-        #  CONSTRUCCIÓN DE TABLA DP: SUBESTRUCTURA ÓPTIMA 
-        # Itera sobre tamaños de subconjuntos crecientes (bottom-up)
-        for tamano in range(2, n + 1):
-            for subconjunto_tuple in combinations(destinos, tamano):
-                subconjunto = frozenset(subconjunto_tuple)
-                
-                # Para cada posible último nodo en el subconjunto
-                for ultimo in subconjunto:
-                    subconjunto_prev = subconjunto - {ultimo}  # Subconjunto sin último nodo
-                    
-                    mejor_dist = float('inf')
-                    mejor_prev = None
-                    
-                    #SUBESTRUCTURA ÓPTIMA: Prueba todos los posibles penúltimos nodos
-                    # La mejor ruta a 'ultimo' viene de la mejor ruta a algún 'penultimo'
-                    for penultimo in subconjunto_prev:
-                        if (subconjunto_prev, penultimo) not in dp:
-                            continue
-                        
-                        #REUTILIZA solución del subproblema menor
-                        dist_prev, _ = dp[(subconjunto_prev, penultimo)]  # Consulta tabla DP
-                        dist_actual = self.matriz_distancias.get((penultimo, ultimo), float('inf'))
-                        dist_total = dist_prev + dist_actual
-                        
-                        if dist_total < mejor_dist:
-                            mejor_dist = dist_total
-                            mejor_prev = penultimo
-                    
-                    #MEMORIZACIÓN: Almacena resultado del subproblema
-                    dp[(subconjunto, ultimo)] = (mejor_dist, mejor_prev)
-        
-        # Encontrar solucion optima
-        todos_destinos = frozenset(destinos)
-        mejor_dist_total = float('inf')
-        mejor_ultimo = None
-        
-        for ultimo in destinos:
-            if (todos_destinos, ultimo) in dp:
-                dist, _ = dp[(todos_destinos, ultimo)]
-                if dist < mejor_dist_total:
-                    mejor_dist_total = dist
-                    mejor_ultimo = ultimo
-        
-        if mejor_ultimo is None:
+        if mejor_dist_total == float('inf'):
             return float('inf'), [origen]
         
         #  RECONSTRUCCIÓN DE SOLUCIÓN: BACKTRACKING EN DP 
-        #BACKTRACKING: Reconstruye la secuencia óptima desde la tabla DP
-        secuencia = [mejor_ultimo]
-        subconjunto_actual = todos_destinos
+        #BACKTRACKING: Sigue los punteros dp_prev hasta volver al origen
+        secuencia = []
+        mascara_actual = todos
         nodo_actual = mejor_ultimo
-        
-        # Sigue los punteros 'nodo_previo' almacenados en la tabla DP
-        while len(subconjunto_actual) > 1:
-            _, prev = dp[(subconjunto_actual, nodo_actual)]  # Consulta nodo previo óptimo
-            secuencia.append(prev)
-            subconjunto_actual = subconjunto_actual - {nodo_actual}  # Reduce subconjunto
+        while nodo_actual != -1:
+            secuencia.append(destinos[nodo_actual])
+            prev = int(dp_prev[mascara_actual, nodo_actual])  # Consulta nodo previo óptimo
+            mascara_actual ^= 1 << nodo_actual  # Reduce subconjunto
             nodo_actual = prev
         
         secuencia.reverse()  # Invierte para tener orden correcto
@@ -230,13 +590,148 @@ class CalculadorRutas:
         
         # Si se solicita retornar al origen, agregar al final
         if retornar_origen:
-            dist_retorno = self.matriz_distancias.get((mejor_ultimo, origen), float('inf'))
-            mejor_dist_total += dist_retorno
             secuencia.append(origen)
         
         return mejor_dist_total, secuencia
     
-    def calcular_ruta_tsp(self, origen: int, destinos: List[int], retornar_origen: bool = True) -> Tuple[float, List[int]]:
+    def _tabla_held_karp(self, D: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Construye la tabla DP de Held-Karp indexada por mascara de bits
+        
+        Args:
+            D: Matriz local (n + 1, n + 1); indices 0..n-1 son destinos y n el origen
+            n: Numero de destinos
+            
+        Returns:
+            Tupla (dp_dist, dp_prev) de forma (2^n, n)
+        """
+        # Estado: dp_dist[mascara, ultimo] = distancia_minima
+        #         dp_prev[mascara, ultimo] = penultimo destino (-1 si es el origen)
+        # - mascara: entero cuyo bit i indica si destinos[i] ya fue visitado
+        # - ultimo: indice del último destino visitado en el subconjunto
+        # Los estados sin calcular quedan en inf, asi que no aportan candidatos
+        
+        # Numero de bits activos de cada mascara, para recorrer por tamaño
+        bits = np.arange(n)
+        mascaras = np.arange(1 << n)
+        tamanos = np.zeros(1 << n, dtype=np.int64)
+        for i in range(n):
+            tamanos += (mascaras >> i) & 1
+        
+        if NUMBA_DISPONIBLE:
+            # Nucleo compilado: cada capa de tamaño se reparte entre hilos
+            orden = np.argsort(tamanos, kind='stable')
+            limites = np.searchsorted(tamanos[orden], np.arange(n + 2))
+            return held_karp_dp(np.ascontiguousarray(D), n, orden, limites)
+        
+        if n <= MAX_DESTINOS_DP_PYTHON:
+            dp_dist, dp_prev = self._tabla_held_karp_python(D.tolist(), n)
+            return (np.array(dp_dist).reshape(1 << n, n),
+                    np.array(dp_prev, dtype=np.int16).reshape(1 << n, n))
+        
+        dp_dist = np.full((1 << n, n), np.inf)
+        dp_prev = np.full((1 << n, n), -1, dtype=np.int16)
+        
+        #CASO BASE: Ir desde origen a cada destino individualmente
+        dp_dist[1 << bits, bits] = D[n, :n]  # Memoriza caso base
+        
+        D_destinos = D[:n, :n]
+        # Limita el tamaño del bloque (mascaras x ultimo x penultimo) en memoria
+        bloque = max(1, (1 << 22) // (n * n))
+        
+        #  CONSTRUCCIÓN DE TABLA DP: SUBESTRUCTURA ÓPTIMA 
+        # Itera sobre tamaños de subconjuntos crecientes (bottom-up)
+        for tamano in range(2, n + 1):
+            capa = mascaras[tamanos == tamano]
+            for inicio in range(0, len(capa), bloque):
+                mascara = capa[inicio:inicio + bloque]
+                # Subconjunto sin último nodo, para cada posible último
+                mascara_prev = mascara[:, None] ^ (1 << bits)[None, :]
+                
+                #SUBESTRUCTURA ÓPTIMA: candidatos[m, ultimo, penultimo]
+                # = dp_dist[mascara_prev, penultimo] + D[penultimo, ultimo]
+                candidatos = dp_dist[mascara_prev] + D_destinos.T[None, :, :]
+                mejor_prev = np.argmin(candidatos, axis=2)
+                mejor_dist = np.take_along_axis(candidatos, mejor_prev[:, :, None], axis=2)[:, :, 0]
+                
+                # Solo son estados validos los 'ultimo' que pertenecen a la mascara
+                en_mascara = ((mascara[:, None] >> bits[None, :]) & 1).astype(bool)
+                #MEMORIZACIÓN: Almacena resultado del subproblema
+                dp_dist[mascara] = np.where(en_mascara, mejor_dist, np.inf)
+                dp_prev[mascara] = np.where(en_mascara, mejor_prev, -1)
+        
+        return dp_dist, dp_prev
+    
+    def _tabla_held_karp_python(self, D: List[List[float]], n: int) -> Tuple[List[float], List[int]]:
+        """
+        Tabla DP de Held-Karp en Python puro con subconjuntos como enteros
+        
+        Args:
+            D: Matriz local como listas; indices 0..n-1 son destinos y n el origen
+            n: Numero de destinos
+            
+        Returns:
+            Tupla (dp_dist, dp_prev) planas; el estado (mascara, ultimo) esta en mascara * n + ultimo
+        """
+        dp_dist = [float('inf')] * ((1 << n) * n)
+        dp_prev = [-1] * ((1 << n) * n)
+        
+        #CASO BASE: Ir desde origen a cada destino individualmente
+        for i in range(n):
+            dp_dist[(1 << i) * n + i] = D[n][i]
+        
+        # Toda mascara es mayor que sus subconjuntos, asi que el orden numerico
+        # ya procesa los subconjuntos menores primero
+        for mascara in range(1, 1 << n):
+            if mascara & (mascara - 1) == 0:
+                continue  # Un solo bit: caso base
+            
+            restantes = mascara
+            while restantes:
+                bit = restantes & -restantes  # Bit activo mas bajo
+                restantes ^= bit
+                ultimo = bit.bit_length() - 1
+                mascara_prev = mascara ^ bit  # Subconjunto sin último nodo
+                
+                mejor_dist = float('inf')
+                mejor_prev = -1
+                candidatos = mascara_prev
+                while candidatos:
+                    bit_prev = candidatos & -candidatos
+                    candidatos ^= bit_prev
+                    penultimo = bit_prev.bit_length() - 1
+                    dist_total = dp_dist[mascara_prev * n + penultimo] + D[penultimo][ultimo]
+                    if dist_total < mejor_dist:
+                        mejor_dist = dist_total
+                        mejor_prev = penultimo
+                
+                dp_dist[mascara * n + ultimo] = mejor_dist
+                dp_prev[mascara * n + ultimo] = mejor_prev
+        
+        return dp_dist, dp_prev
+    
+    def _matriz_local(self, nodos: List[int]) -> np.ndarray:
+        """
+        Submatriz densa de distancias entre los nodos dados
+        
+        Usa matriz_densa si todos los nodos fueron precalculados; si no, consulta
+        matriz_distancias (inf para pares desconocidos)
+        
+        Args:
+            nodos: Lista de nodos en el orden deseado de filas/columnas
+            
+        Returns:
+            Array (len(nodos), len(nodos)) con las distancias
+        """
+        if all(nodo in self.indice_interes for nodo in nodos):
+            posiciones = [self.indice_interes[nodo] for nodo in nodos]
+            return self.matriz_densa[np.ix_(posiciones, posiciones)]
+        
+        return np.array([[self.matriz_distancias.get((i, j), float('inf')) for j in nodos]
+                         for i in nodos], dtype=np.float64)
+    
+    def calcular_ruta_tsp(self, origen: int, destinos: List[int], retornar_origen: bool = True,
+                          tour_inicial: Optional[List[int]] = None) -> Tuple[float, List[int]]:
         """
         Calcula ruta TSP optima eligiendo algoritmo segun numero de destinos
         
@@ -244,11 +739,20 @@ class CalculadorRutas:
             origen: Nodo de inicio
             destinos: Lista de nodos a visitar
             retornar_origen: Si True, retorna al origen (ciclo cerrado TSP)
+            tour_inicial: Recorrido previo; si difiere en un destino y la tabla
+                exacta seria costosa (sin numba), se repara en su lugar
             
         Returns:
             Tupla (distancia_total, secuencia_ordenada)
         """
         n = len(destinos)
+        self.tsp_heuristico = False
+        
+        if tour_inicial is not None and not NUMBA_DISPONIBLE and n > MAX_DESTINOS_EXACTO_PYTHON:
+            reparado = self._reparar_tour(origen, destinos, retornar_origen, tour_inicial)
+            if reparado is not None:
+                self.tsp_heuristico = True
+                return reparado
         
         if n == 0:
             return 0, [origen]
@@ -264,11 +768,135 @@ class CalculadorRutas:
         
         return self.held_karp(origen, destinos, retornar_origen)
 
+    def _reparar_tour(self, origen: int, destinos: List[int], retornar_origen: bool,
+                      tour_inicial: List[int]) -> Optional[Tuple[float, List[int]]]:
+        """
+        Ajusta un recorrido previo que difiere en a lo sumo un destino agregado y
+        uno quitado: quita la parada sobrante, inserta la nueva por menor costo y
+        aplica unas pocas pasadas de 2-opt
+        
+        Args:
+            origen: Nodo de inicio
+            destinos: Lista de nodos a visitar
+            retornar_origen: Si True, el recorrido vuelve al origen
+            tour_inicial: Recorrido previo desde el mismo origen
+            
+        Returns:
+            Tupla (distancia_total, secuencia), o None si el recorrido no sirve
+        """
+        nodos = set(destinos)
+        retornaba = len(tour_inicial) > 1 and tour_inicial[-1] == origen
+        if (not tour_inicial or tour_inicial[0] != origen or retornaba != retornar_origen
+                or len(nodos) != len(destinos) or origen in nodos):
+            return None
+        
+        paradas = tour_inicial[1:-1] if retornaba else tour_inicial[1:]
+        conservadas = [nodo for nodo in paradas if nodo in nodos]
+        faltantes = nodos.difference(conservadas)
+        if len(paradas) - len(conservadas) > 1 or len(faltantes) > 1:
+            return None
+        if not all(nodo in self.indice_interes for nodo in destinos + [origen]):
+            return None
+        
+        indice = self.indice_interes
+        matriz = self.matriz_densa
+        secuencia = [origen] + conservadas + ([origen] if retornar_origen else [])
+        for nodo in faltantes:
+            secuencia = self.insertar_menor_costo(secuencia, nodo, retornar_origen, indice, matriz)
+        secuencia = self.mejorar_2opt(secuencia, retornar_origen, indice, matriz, MAX_PASADAS_REPARACION)
+        
+        posiciones = [indice[nodo] for nodo in secuencia]
+        distancia = float(matriz[posiciones[:-1], posiciones[1:]].sum())
+        if distancia == float('inf'):
+            return None
+        return distancia, secuencia
     
+    @staticmethod
+    def insertar_menor_costo(secuencia: List[int], nodo: int, retorna: bool,
+                             indice: Dict[int, int], matriz: np.ndarray) -> List[int]:
+        """
+        Inserta nodo donde menos aumenta el recorrido: d(a, nodo) + d(nodo, b) - d(a, b)
+        
+        Args:
+            secuencia: Recorrido actual (empieza en el origen; termina en el si retorna)
+            nodo: Nodo a insertar
+            retorna: True si el recorrido vuelve al origen
+            indice: Posicion de cada nodo en la matriz
+            matriz: Matriz densa de distancias entre nodos de interes
+            
+        Returns:
+            Nuevo recorrido con el nodo insertado
+        """
+        k = indice[nodo]
+        fila_desde = matriz[:, k]
+        fila_hacia = matriz[k, :]
+        posiciones = [indice[n] for n in secuencia]
+        
+        mejor_pos = len(secuencia)
+        # Sin retorno tambien se puede agregar al final
+        mejor_costo = float(fila_desde[posiciones[-1]]) if not retorna else math.inf
+        for i in range(len(posiciones) - 1):
+            a, b = posiciones[i], posiciones[i + 1]
+            costo = fila_desde[a] + fila_hacia[b] - matriz[a, b]
+            if costo < mejor_costo:
+                mejor_costo = costo
+                mejor_pos = i + 1
+        
+        if retorna and mejor_pos == len(secuencia):
+            # Ningun tramo finito: antes del retorno al origen
+            mejor_pos = len(secuencia) - 1
+        return secuencia[:mejor_pos] + [nodo] + secuencia[mejor_pos:]
+    
+    @staticmethod
+    def mejorar_2opt(secuencia: List[int], retorna: bool, indice: Dict[int, int],
+                     matriz: np.ndarray, max_pasadas: Optional[int] = None) -> List[int]:
+        """
+        Mejora el recorrido invirtiendo tramos (2-opt) mientras se reduzca el costo
+        
+        Las distancias pueden ser asimetricas (calles de un sentido), asi que cada
+        candidato se evalua con el costo completo del recorrido.
+        
+        Args:
+            secuencia: Recorrido (el origen y, si retorna, el retorno quedan fijos)
+            retorna: True si el recorrido vuelve al origen
+            indice: Posicion de cada nodo en la matriz
+            matriz: Matriz densa de distancias entre nodos de interes
+            max_pasadas: Limite de pasadas completas (None: hasta no mejorar)
+            
+        Returns:
+            Recorrido mejorado
+        """
+        posiciones = np.array([indice[n] for n in secuencia], dtype=np.int64)
+        
+        def costo(pos):
+            return float(matriz[pos[:-1], pos[1:]].sum())
+        
+        mejor = costo(posiciones)
+        ultimo = len(posiciones) - (2 if retorna else 1)
+        mejorado = True
+        pasadas = 0
+        while mejorado and (max_pasadas is None or pasadas < max_pasadas):
+            mejorado = False
+            pasadas += 1
+            for i in range(1, ultimo):
+                for j in range(i + 1, ultimo + 1):
+                    candidato = posiciones.copy()
+                    candidato[i:j + 1] = candidato[i:j + 1][::-1]
+                    costo_candidato = costo(candidato)
+                    if costo_candidato < mejor - 1e-9:
+                        posiciones, mejor = candidato, costo_candidato
+                        mejorado = True
+        
+        nodo_de = {i: nodo for nodo, i in indice.items()}
+        return [nodo_de[i] for i in posiciones.tolist()]
+
     def calcular_camino_completo(self, secuencia: List[int]) -> Tuple[List[int], float]:
         """
         Calcula el camino completo nodo por nodo para una secuencia de puntos
         
+        Los tramos entre nodos precalculados se reconstruyen con los arboles de
+        padres guardados; solo los demas tramos ejecutan una nueva busqueda.
+        
         Args:
             secuencia: Lista ordenada de nodos a visitar
             
@@ -282,7 +910,9 @@ class CalculadorRutas:
             origen = secuencia[i]
             destino = secuencia[i + 1]
             
-            dist, camino_segmento = self.dijkstra(origen, destino)
+            dist, camino_segmento = self._camino_precalculado(origen, destino)
+            if camino_segmento is None:
+                dist, camino_segmento = self.dijkstra(origen, destino)
             
             if not camino_segmento:
                 raise ValueError(f"No hay camino entre {origen} y {destino}")
@@ -296,3 +926,55 @@ class CalculadorRutas:
             distancia_total += dist
         
         return camino_completo, distancia_total
+    
+    def _camino_precalculado(self, origen: int, destino: int):
+        """
+        Camino entre dos nodos de interes usando los arboles de padres de
+        precalcular_matriz_distancias
+        
+        Args:
+            origen: Nodo inicial
+            destino: Nodo final
+            
+        Returns:
+            Tupla (distancia, camino), o (None, None) si el par no fue precalculado
+        """
+        if origen not in self.indice_interes or destino not in self.indice_interes:
+            return None, None
+        
+        dist = float(self.matriz_densa[self.indice_interes[origen], self.indice_interes[destino]])
+        if dist == float('inf'):
+            return float('inf'), []
+        camino = self.camino_interes(origen, destino, self.padres_interes, self.rango_interes)
+        if camino is None:
+            return None, None
+        return dist, camino
+    
+    def camino_interes(self, origen: int, destino: int, padres_interes: Dict,
+                       rango_interes: Optional[Dict[int, int]]) -> Optional[List[int]]:
+        """
+        Reconstruye el camino entre dos nodos de interes con el arbol que lo
+        cubre: el del origen o, si el destino llego despues al pool (grafo
+        simetrico), el del destino recorrido al reves
+        
+        Args:
+            origen: Nodo inicial
+            destino: Nodo final
+            padres_interes: Arboles de padres por nodo de interes
+            rango_interes: Orden de llegada al pool de cada nodo (None: sin pool)
+            
+        Returns:
+            Lista de nodos desde el origen hasta el destino, o None si no hay arbol
+        """
+        if rango_interes is not None and rango_interes[destino] > rango_interes[origen]:
+            padres = padres_interes.get(destino)
+            if padres is None:
+                return None
+            camino = self._reconstruir_camino(padres, self.nodo_a_indice[origen])
+            camino.reverse()
+            return camino
+        
+        padres = padres_interes.get(origen)
+        if padres is None:
+            return None
+        return self._reconstruir_camino(padres, self.nodo_a_indice[destino])
@@ -8,18 +8,186 @@ TÉCNICA IMPLEMENTADA: GEOMETRÍA COMPUTACIONAL + ALGORITMOS DE BÚSQUEDA
 - Generación de guías paso a paso desde secuencia de nodos
 """
 
+from bisect import bisect_left
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional, Any
 import math
 import logging
+import numpy as np
 import folium
 
+from ..utils.jit import NUMBA_DISPONIBLE, njit, prange
+
 logger = logging.getLogger(__name__)
 
+RADIO_TIERRA_KM = 6371.0
+DIAMETRO_TIERRA_KM = 2 * RADIO_TIERRA_KM
+
+# Funciones de math ligadas a nombres del modulo: evita la busqueda del atributo
+# en cada operacion trigonometrica de las rutas escalares en Python puro
+_sin, _cos, _atan2, _asin, _sqrt = math.sin, math.cos, math.atan2, math.asin, math.sqrt
+
+# Conversion de unidades como producto por constante (lo mismo que hacen
+# math.radians / math.degrees, sin la llamada a funcion)
+_GRADOS_A_RAD = math.pi / 180.0
+_RAD_A_GRADOS = 180.0 / math.pi
+
+# Clasificacion de giros por tabla: el indice de la etiqueta es la cantidad de
+# limites estrictamente menores que el angulo (bisect_left / searchsorted).
+# Los limites cuyo valor exacto pertenece al rango superior (-110, -20, 70, 160)
+# se desplazan al flotante inmediatamente inferior para conservar esa inclusion.
+ETIQUETAS_GIRO = (
+    "↩ Retorno",
+    "↙ Izquierda cerrada",
+    "← Izquierda",
+    "↖ Ligera izquierda",
+    "↑ Recto",
+    "↗ Ligera derecha",
+    "→ Derecha",
+    "↘ Derecha cerrada",
+    "↩ Retorno",
+)
+LIMITES_GIRO = [
+    -160.0,
+    float(np.nextafter(-110.0, -np.inf)),
+    -70.0,
+    float(np.nextafter(-20.0, -np.inf)),
+    20.0,
+    float(np.nextafter(70.0, -np.inf)),
+    110.0,
+    float(np.nextafter(160.0, -np.inf)),
+]
+_LIMITES_GIRO_ARRAY = np.array(LIMITES_GIRO)
+
+# Atajo para giros rectos: con la proyeccion equirectangular, un giro menor que
+# este umbral queda con margen dentro de "Recto" (±20°) en tramos urbanos, donde
+# la diferencia con el bearing esferico es de centesimas de grado
+GIRO_RECTO_RAPIDO_GRADOS = 15.0
+_SIN2_RECTO_RAPIDO = math.sin(math.radians(GIRO_RECTO_RAPIDO_GRADOS)) ** 2
+_SEGMENTO_MAX_RAPIDO2 = 0.1 ** 2  # tramos de hasta ~0.1° (~11 km)
+
+# Plantilla de instruccion por tipo de giro, alineada con ETIQUETAS_GIRO: el indice
+# que da la clasificacion selecciona la etiqueta y la plantilla sin comparar textos
+PLANTILLA_SALIDA = "Salga hacia el destino por {calle} durante {distancia:.2f} km"
+PLANTILLAS_GIRO = (
+    "Dé vuelta en U en {calle} y continúe {distancia:.2f} km",
+    "Gire ligeramente a la izquierda en {calle} y continúe {distancia:.2f} km",
+    "Gire a la izquierda en {calle} y continúe {distancia:.2f} km",
+    "Gire ligeramente a la izquierda en {calle} y continúe {distancia:.2f} km",
+    "Continúe recto por {calle} durante {distancia:.2f} km",
+    "Gire ligeramente a la derecha en {calle} y continúe {distancia:.2f} km",
+    "Gire a la derecha en {calle} y continúe {distancia:.2f} km",
+    "Gire ligeramente a la derecha en {calle} y continúe {distancia:.2f} km",
+    "Dé vuelta en U en {calle} y continúe {distancia:.2f} km",
+)
+
+# Metodos format ya ligados: en el bucle se indexan y se llaman sin buscar atributos
+_FORMATEAR_SALIDA = PLANTILLA_SALIDA.format
+_FORMATEAR_GIRO = tuple(plantilla.format for plantilla in PLANTILLAS_GIRO)
+
+# Textos de los marcadores de visualizar_en_mapa
+PLANTILLA_POPUP_PASO = "<b>Paso {inst.paso}</b><br>{inst.direccion}<br>{inst.instruccion}"
+PLANTILLA_TOOLTIP_PASO = "Paso {inst.paso}: {inst.direccion}"
+
+# Bloque de cada paso en exportar_instrucciones_texto
+PLANTILLA_BLOQUE_PASO = (
+    "PASO {inst.paso}\n"
+    "  Dirección: {inst.direccion}\n"
+    "  Instrucción: {inst.instruccion}\n"
+    "  Distancia: {inst.distancia_km:.2f} km\n"
+    "  Desde nodo {inst.nodo_origen} → Hacia nodo {inst.nodo_destino}\n"
+)
+
+
+@njit(cache=True)
+def _bearing(lat1, lon1, lat2, lon2):
+    """Bearing en grados [0, 360) entre dos coordenadas en grados"""
+    lat1_rad = lat1 * _GRADOS_A_RAD
+    lat2_rad = lat2 * _GRADOS_A_RAD
+    dlon_rad = (lon2 - lon1) * _GRADOS_A_RAD
+    
+    x = _sin(dlon_rad) * _cos(lat2_rad)
+    y = _cos(lat1_rad) * _sin(lat2_rad) - \
+        _sin(lat1_rad) * _cos(lat2_rad) * _cos(dlon_rad)
+    
+    return (_atan2(x, y) * _RAD_A_GRADOS + 360) % 360
+
+
+@njit(cache=True)
+def _angulos_tramo(lat, lon, ini, fin, out):
+    """
+    Angulo de giro en cada nodo intermedio de la ruta lat/lon[ini:fin]
+    
+    out[j - 1] recibe el angulo en el nodo j, normalizado a [-180, 180). Los
+    giros claramente rectos se detectan con la proyeccion equirectangular local
+    (solo productos, sin trigonometria por segmento) y se escriben como 0; los
+    bearings esfericos se calculan solo para los demas, una vez por segmento.
+    """
+    bearings = np.full(fin - ini - 1, np.nan)
+    for j in range(ini + 1, fin - 1):
+        k = j - ini
+        
+        # Vectores de los segmentos que llegan y salen de j en el plano local
+        cos_lat = _cos(lat[j] * _GRADOS_A_RAD)
+        dx1 = (lon[j] - lon[j - 1]) * cos_lat
+        dy1 = lat[j] - lat[j - 1]
+        dx2 = (lon[j + 1] - lon[j]) * cos_lat
+        dy2 = lat[j + 1] - lat[j]
+        norma1 = dx1 * dx1 + dy1 * dy1
+        norma2 = dx2 * dx2 + dy2 * dy2
+        cruz = dx1 * dy2 - dy1 * dx2
+        punto = dx1 * dx2 + dy1 * dy2
+        
+        # Recto si el angulo plano es menor que GIRO_RECTO_RAPIDO_GRADOS; los
+        # segmentos nulos o largos siempre van por la formula esferica
+        if (0.0 < norma1 < _SEGMENTO_MAX_RAPIDO2 and 0.0 < norma2 < _SEGMENTO_MAX_RAPIDO2
+                and punto > 0.0 and cruz * cruz < _SIN2_RECTO_RAPIDO * norma1 * norma2):
+            out[j - 1] = 0.0
+            continue
+        
+        if np.isnan(bearings[k - 1]):
+            bearings[k - 1] = _bearing(lat[j - 1], lon[j - 1], lat[j], lon[j])
+        if np.isnan(bearings[k]):
+            bearings[k] = _bearing(lat[j], lon[j], lat[j + 1], lon[j + 1])
+        out[j - 1] = (bearings[k] - bearings[k - 1] + 180) % 360 - 180
+
+
+@njit(cache=True, parallel=True)
+def _angulos_rutas(lat, lon, offsets, out):
+    """
+    Angulos de giro de varias rutas concatenadas, repartiendo las rutas entre hilos
+    
+    La ruta k ocupa [offsets[k], offsets[k + 1]); las posiciones de out entre
+    rutas no se tocan.
+    """
+    for k in prange(offsets.shape[0] - 1):
+        _angulos_tramo(lat, lon, offsets[k], offsets[k + 1], out)
+
+
+@njit(cache=True)
+def _haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia Haversine en km entre dos coordenadas en grados"""
+    lat1_rad = lat1 * _GRADOS_A_RAD
+    lat2_rad = lat2 * _GRADOS_A_RAD
+    
+    # sin² por producto; (1 - cos)/2 pierde precision en tramos cortos
+    sin_dlat = _sin((lat2 - lat1) * _GRADOS_A_RAD / 2)
+    sin_dlon = _sin((lon2 - lon1) * _GRADOS_A_RAD / 2)
+    a = sin_dlat * sin_dlat + _cos(lat1_rad) * _cos(lat2_rad) * sin_dlon * sin_dlon
+    
+    # 2·asin(√a) equivale a 2·atan2(√a, √(1 - a)) con una raiz y un trascendente menos
+    return DIAMETRO_TIERRA_KM * _asin(_sqrt(min(a, 1.0)))
+
 
 @dataclass
 class InstruccionRuta:
     """Representa una instruccion de navegacion paso a paso"""
+    # Sin __dict__ por instancia: menos memoria y acceso a atributos por slot
+    # (declarado a mano; dataclass(slots=True) requiere Python 3.10)
+    __slots__ = ('paso', 'nodo_origen', 'nodo_destino', 'calle', 'distancia_km',
+                 'direccion', 'instruccion', 'lat_origen', 'lon_origen',
+                 'lat_destino', 'lon_destino')
+    
     paso: int
     nodo_origen: int
     nodo_destino: int
@@ -54,6 +222,11 @@ class GeneradorGuiaRuta:
         """
         self.grafo = grafo
         self.nodos_coords = nodos_coords
+        
+        # Coordenadas en arrays contiguos (SoA): indice del nodo -> _lats/_lons
+        self._node_index = {nodo: i for i, nodo in enumerate(nodos_coords)}
+        self._lats = np.fromiter((c[0] for c in nodos_coords.values()), dtype=np.float64, count=len(nodos_coords))
+        self._lons = np.fromiter((c[1] for c in nodos_coords.values()), dtype=np.float64, count=len(nodos_coords))
         logger.info(f"GeneradorGuiaRuta inicializado con {len(nodos_coords)} nodos")
     
     def generar_guia(self, secuencia_nodos: List[int]) -> List[InstruccionRuta]:
@@ -81,158 +254,203 @@ class GeneradorGuiaRuta:
         
         logger.info(f"Generando guía para ruta de {len(secuencia_nodos)} nodos")
         
-        instrucciones = []
+        # Coordenadas de toda la ruta reunidas una vez; de ellas salen las
+        # clasificaciones de giro (vectorizado) y los extremos de cada paso
+        coords = self._coordenadas_ruta(secuencia_nodos)
+        giros = self._clasificar_giros(coords).tolist()
+        instrucciones = self._construir_instrucciones(
+            secuencia_nodos, coords[:, 0].tolist(), coords[:, 1].tolist(), giros, 0
+        )
+        
+        logger.info(f"Generadas {len(instrucciones)} instrucciones de navegación")
+        return instrucciones
+    
+    def generar_guias(self, rutas: List[List[int]]) -> List[List[InstruccionRuta]]:
+        """
+        Genera las guias de varias rutas a la vez (p. ej. todos los vehiculos)
+        
+        Las coordenadas de todas las rutas se reunen en un solo array plano
+        delimitado por offsets, y los bearings de cada ruta se calculan en
+        paralelo (prange) cuando numba esta disponible. Solo la creacion de
+        los objetos InstruccionRuta queda en Python.
+        
+        Args:
+            rutas: Lista de secuencias de nodos, una por ruta
+            
+        Returns:
+            Lista con las instrucciones de cada ruta (vacia si tiene menos de 2 nodos)
+        """
+        validas = [r for r, secuencia in enumerate(rutas) if len(secuencia) >= 2]
+        guias = [[] for _ in rutas]
+        if not validas:
+            return guias
+        
+        logger.info(f"Generando guías para {len(validas)} rutas")
+        
+        # Rutas concatenadas; la ruta k ocupa [offsets[k], offsets[k + 1])
+        longitudes = [len(rutas[r]) for r in validas]
+        offsets = np.zeros(len(validas) + 1, dtype=np.int64)
+        np.cumsum(longitudes, out=offsets[1:])
+        nodos = [nodo for r in validas for nodo in rutas[r]]
+        
+        coords = self._coordenadas_ruta(nodos)
+        giros = self._clasificar_giros(coords, offsets).tolist()
+        lats = coords[:, 0].tolist()
+        lons = coords[:, 1].tolist()
         
-        for i in range(len(secuencia_nodos) - 1):
+        for k, r in enumerate(validas):
+            guias[r] = self._construir_instrucciones(rutas[r], lats, lons, giros, int(offsets[k]))
+        
+        return guias
+    
+    def _construir_instrucciones(self, secuencia_nodos: List[int], lats: List[float],
+                                 lons: List[float], giros: List[int],
+                                 inicio: int) -> List[InstruccionRuta]:
+        """
+        Crea las InstruccionRuta de una ruta a partir de datos ya calculados
+        
+        Args:
+            secuencia_nodos: Lista ordenada de nodos de la ruta
+            lats: Latitudes de los nodos (la ruta empieza en la posicion inicio)
+            lons: Longitudes de los nodos (misma disposicion que lats)
+            giros: Indices de ETIQUETAS_GIRO; el giro en el nodo inicio + i
+                esta en la posicion inicio + i - 1
+            inicio: Posicion del primer nodo de la ruta en lats/lons/giros
+            
+        Returns:
+            Lista de InstruccionRuta con paso a paso
+        """
+        # Lista de tamano fijo (un paso por arista) y metodo ligado a un nombre local
+        num_pasos = len(secuencia_nodos) - 1
+        instrucciones = [None] * num_pasos
+        distancia_arista_km = self._distancia_arista_km
+        # El nivel se consulta una vez: sin DEBUG no se arma ningun mensaje por paso
+        depurar = logger.isEnabledFor(logging.DEBUG)
+        
+        for i in range(num_pasos):
             nodo_actual = secuencia_nodos[i]
             nodo_siguiente = secuencia_nodos[i + 1]
+            j = inicio + i
             
             # 1. Extraer datos de la arista
-            arista_data = self._obtener_datos_arista(nodo_actual, nodo_siguiente)
+            distancia_km = distancia_arista_km(nodo_actual, nodo_siguiente)
+            calle = f"vía {nodo_actual}-{nodo_siguiente}"
             
-            # 2. Calcular direccion (solo si hay nodo previo para comparar)
+            # 2. Direccion y plantilla del paso segun el indice del giro (precalculado)
             if i == 0:
                 direccion = "Salida"
-                logger.debug(f"Paso {i+1}: Salida desde nodo {nodo_actual}")
+                formatear = _FORMATEAR_SALIDA
+                if depurar:
+                    logger.debug("Paso %d: Salida desde nodo %s", i + 1, nodo_actual)
             else:
-                nodo_anterior = secuencia_nodos[i - 1]
-                direccion = self._calcular_direccion(
-                    nodo_anterior, nodo_actual, nodo_siguiente
-                )
-                logger.debug(f"Paso {i+1}: Dirección {direccion} desde nodo {nodo_actual} a {nodo_siguiente}")
+                giro = giros[j - 1]
+                direccion = ETIQUETAS_GIRO[giro]
+                formatear = _FORMATEAR_GIRO[giro]
+                if depurar:
+                    logger.debug("Paso %d: Dirección %s desde nodo %s a %s",
+                                 i + 1, direccion, nodo_actual, nodo_siguiente)
             
             # 3. Generar instruccion textual
-            instruccion_texto = self._generar_instruccion(
-                direccion,
-                arista_data['calle'],
-                arista_data['distancia_km'],
-                i == 0  # es_salida
-            )
+            instruccion_texto = formatear(calle=calle, distancia=distancia_km)
             
             # 4. Crear objeto InstruccionRuta
-            instrucciones.append(InstruccionRuta(
+            instrucciones[i] = InstruccionRuta(
                 paso=i + 1,
                 nodo_origen=nodo_actual,
                 nodo_destino=nodo_siguiente,
-                calle=arista_data['calle'],
-                distancia_km=arista_data['distancia_km'],
+                calle=calle,
+                distancia_km=distancia_km,
                 direccion=direccion,
                 instruccion=instruccion_texto,
-                lat_origen=arista_data['lat_origen'],
-                lon_origen=arista_data['lon_origen'],
-                lat_destino=arista_data['lat_destino'],
-                lon_destino=arista_data['lon_destino']
-            ))
+                lat_origen=lats[j],
+                lon_origen=lons[j],
+                lat_destino=lats[j + 1],
+                lon_destino=lons[j + 1]
+            )
         
-        logger.info(f"Generadas {len(instrucciones)} instrucciones de navegación")
         return instrucciones
     
-    def _obtener_datos_arista(self, nodo1: int, nodo2: int) -> dict:
+    def _coordenadas_ruta(self, secuencia_nodos: List[int]) -> np.ndarray:
         """
-        Extrae informacion de la arista entre dos nodos
+        Reune las coordenadas de la ruta en un array (n, 2) de (lat, lon)
+        
+        Args:
+            secuencia_nodos: Lista ordenada de nodos
+            
+        Returns:
+            Array de coordenadas en grados; (0, 0) para nodos sin coordenadas
+        """
+        indices = np.fromiter((self._node_index.get(nodo, -1) for nodo in secuencia_nodos),
+                              dtype=np.int64, count=len(secuencia_nodos))
+        existe = indices >= 0
+        coords = np.zeros((len(secuencia_nodos), 2))
+        coords[existe, 0] = self._lats[indices[existe]]
+        coords[existe, 1] = self._lons[indices[existe]]
+        return coords
+    
+    def _distancia_arista_km(self, nodo1: int, nodo2: int) -> float:
+        """
+        Distancia de la arista entre dos nodos segun el grafo
         
         Args:
             nodo1: Nodo origen
             nodo2: Nodo destino
             
         Returns:
-            Diccionario con datos de la arista:
-                - calle: nombre de calle (o "Calle desconocida")
-                - distancia_km: distancia en kilometros
-                - lat_origen, lon_origen: coordenadas origen
-                - lat_destino, lon_destino: coordenadas destino
+            Distancia en kilometros (0 si la arista no existe)
         """
-        # Obtener distancia del grafo
         distancia_metros = 0
         if nodo1 in self.grafo and nodo2 in self.grafo[nodo1]:
             distancia_metros = self.grafo[nodo1][nodo2]
         else:
             logger.warning(f"Arista {nodo1}->{nodo2} no encontrada en grafo")
-        
-        # Obtener coordenadas
-        lat_origen, lon_origen = self.nodos_coords.get(nodo1, (0.0, 0.0))
-        lat_destino, lon_destino = self.nodos_coords.get(nodo2, (0.0, 0.0))
-        
-        # Nombre de calle (por ahora generico, puede mejorarse con OSM data)
-        calle = f"vía {nodo1}-{nodo2}"
-        
-        return {
-            'calle': calle,
-            'distancia_km': distancia_metros / 1000.0,
-            'lat_origen': lat_origen,
-            'lon_origen': lon_origen,
-            'lat_destino': lat_destino,
-            'lon_destino': lon_destino
-        }
+        return distancia_metros / 1000.0
     
-    def _calcular_direccion(self, nodo_anterior: int, nodo_actual: int, 
-                           nodo_siguiente: int) -> str:
+    def _clasificar_giros(self, coords: np.ndarray,
+                          offsets: Optional[np.ndarray] = None) -> np.ndarray:
         """
-        Calcula direccion del giro usando bearings
+        Clasifica el giro en cada nodo intermedio de la ruta usando bearings
         
         TECNICA: GEOMETRIA COMPUTACIONAL
-        - Calcula bearing (rumbo) entre dos pares de coordenadas
-        - Diferencia de bearings determina angulo de giro
-        - Clasifica angulo en direccion legible
-        
-        Args:
-            nodo_anterior: Nodo previo en la ruta
-            nodo_actual: Nodo actual (punto de giro)
-            nodo_siguiente: Siguiente nodo
-            
-        Returns:
-            String con direccion clasificada (ej: "→ Derecha", "↑ Recto")
-        """
-        # Obtener coordenadas
-        lat1, lon1 = self.nodos_coords.get(nodo_anterior, (0.0, 0.0))
-        lat2, lon2 = self.nodos_coords.get(nodo_actual, (0.0, 0.0))
-        lat3, lon3 = self.nodos_coords.get(nodo_siguiente, (0.0, 0.0))
-        
-        # Calcular bearings de ambos segmentos
-        bearing1 = self.calcular_bearing(lat1, lon1, lat2, lon2)
-        bearing2 = self.calcular_bearing(lat2, lon2, lat3, lon3)
-        
-        # Calcular angulo de giro (normalizado a [-180, 180])
-        angulo = (bearing2 - bearing1 + 180) % 360 - 180
-        
-        logger.debug(f"Ángulo de giro: {angulo:.1f}° (bearing1={bearing1:.1f}, bearing2={bearing2:.1f})")
-        
-        # Clasificar angulo en direccion
-        direccion = self.clasificar_angulo(angulo)
-        
-        return direccion
-    
-    def _generar_instruccion(self, direccion: str, calle: str, 
-                            distancia: float, es_salida: bool) -> str:
-        """
-        Genera texto legible para la instruccion
+        - Giros claramente rectos por producto cruz en el plano local (con numba)
+        - Bearings de los segmentos restantes; su diferencia determina el angulo de giro
+        - Clasifica cada angulo con una busqueda en la tabla de limites
         
         Args:
-            direccion: Direccion clasificada (ej: "→ Derecha")
-            calle: Nombre de la calle
-            distancia: Distancia en km
-            es_salida: True si es la primera instruccion
+            coords: Array (n, 2) de (lat, lon) en grados de la ruta (n >= 2)
+            offsets: Limites de las rutas si coords concatena varias (opcional);
+                la ruta k ocupa [offsets[k], offsets[k + 1])
             
         Returns:
-            Texto descriptivo para el conductor
+            Array con n - 2 indices de ETIQUETAS_GIRO / PLANTILLAS_GIRO; el giro
+            en el nodo j esta en la posicion j - 1 (los que cruzan de una ruta
+            a otra no tienen sentido y se ignoran)
         """
-        if es_salida:
-            return f"Salga hacia el destino por {calle} durante {distancia:.2f} km"
-        
-        if direccion.startswith("↑"):
-            return f"Continúe recto por {calle} durante {distancia:.2f} km"
-        elif direccion.startswith("→") or direccion == "→ Derecha":
-            return f"Gire a la derecha en {calle} y continúe {distancia:.2f} km"
-        elif direccion.startswith("←") or direccion == "← Izquierda":
-            return f"Gire a la izquierda en {calle} y continúe {distancia:.2f} km"
-        elif direccion.startswith("↩"):
-            return f"Dé vuelta en U en {calle} y continúe {distancia:.2f} km"
-        elif "derecha" in direccion.lower():
-            return f"Gire ligeramente a la derecha en {calle} y continúe {distancia:.2f} km"
-        elif "izquierda" in direccion.lower():
-            return f"Gire ligeramente a la izquierda en {calle} y continúe {distancia:.2f} km"
+        if NUMBA_DISPONIBLE:
+            # Nucleo compilado: atajo para giros rectos y bearings solo donde hacen falta
+            lats = np.ascontiguousarray(coords[:, 0])
+            lons = np.ascontiguousarray(coords[:, 1])
+            angulos = np.zeros(len(coords) - 2)
+            if offsets is None or len(offsets) <= 2:
+                _angulos_tramo(lats, lons, 0, len(coords), angulos)
+            else:
+                # Varias rutas: una por hilo
+                _angulos_rutas(lats, lons, offsets, angulos)
         else:
-            return f"Siga por {calle} durante {distancia:.2f} km ({direccion})"
+            lats = np.radians(coords[:, 0])
+            lons = np.radians(coords[:, 1])
+            
+            # Bearing de cada segmento (misma formula que calcular_bearing)
+            dlon = lons[1:] - lons[:-1]
+            x = np.sin(dlon) * np.cos(lats[1:])
+            y = np.cos(lats[:-1]) * np.sin(lats[1:]) - np.sin(lats[:-1]) * np.cos(lats[1:]) * np.cos(dlon)
+            bearings = (np.degrees(np.arctan2(x, y)) + 360) % 360
+            
+            # Angulo de giro en cada nodo intermedio (normalizado a [-180, 180])
+            angulos = (np.diff(bearings) + 180) % 360 - 180
+        
+        # Clasificacion de todos los giros con una sola busqueda en la tabla de limites
+        return np.searchsorted(_LIMITES_GIRO_ARRAY, angulos, side='left')
     
     @staticmethod
     def calcular_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -251,23 +469,8 @@ class GeneradorGuiaRuta:
         Returns:
             Bearing en grados [0, 360), donde 0° = Norte, 90° = Este
         """
-        # Convertir a radianes
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        dlon_rad = math.radians(lon2 - lon1)
-        
-        # Formula de bearing
-        x = math.sin(dlon_rad) * math.cos(lat2_rad)
-        y = math.cos(lat1_rad) * math.sin(lat2_rad) - \
-            math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(dlon_rad)
-        
-        bearing_rad = math.atan2(x, y)
-        bearing_deg = math.degrees(bearing_rad)
-        
-        # Normalizar a [0, 360)
-        bearing_normalizado = (bearing_deg + 360) % 360
-        
-        return bearing_normalizado
+        # Formula de bearing normalizada a [0, 360) (nucleo compilado si hay numba)
+        return _bearing(lat1, lon1, lat2, lon2)
     
     @staticmethod
     def clasificar_angulo(angulo: float) -> str:
@@ -291,23 +494,8 @@ class GeneradorGuiaRuta:
                 - "↙ Izquierda cerrada": -160° a -110°
                 - "↩ Retorno": |angulo| > 160°
         """
-        # Clasificacion por rangos de angulo
-        if -20 <= angulo <= 20:
-            return "↑ Recto"
-        elif 20 < angulo < 70:
-            return "↗ Ligera derecha"
-        elif 70 <= angulo <= 110:
-            return "→ Derecha"
-        elif 110 < angulo < 160:
-            return "↘ Derecha cerrada"
-        elif -70 < angulo < -20:
-            return "↖ Ligera izquierda"
-        elif -110 <= angulo <= -70:
-            return "← Izquierda"
-        elif -160 < angulo < -110:
-            return "↙ Izquierda cerrada"
-        else:  # |angulo| >= 160
-            return "↩ Retorno"
+        # Clasificacion por tabla de rangos (sin cadena de comparaciones)
+        return ETIQUETAS_GIRO[bisect_left(LIMITES_GIRO, angulo)]
     
     def generar_guia_con_waypoints(self, secuencia_nodos: List[int], 
                                     tipos_waypoint: Optional[Dict[int, str]] = None) -> List[InstruccionRuta]:
@@ -347,30 +535,28 @@ class GeneradorGuiaRuta:
         TECNICA: GEOMETRIA ESFERICA
         Formula de Haversine para distancia sobre superficie terrestre
         
+        Acepta escalares o arrays NumPy; con arrays calcula las N distancias
+        en una sola cadena de ufuncs.
+        
         Args:
             lat1, lon1: Coordenadas punto 1
             lat2, lon2: Coordenadas punto 2
             
         Returns:
-            Distancia en kilometros
+            Distancia en kilometros (array si las entradas son arrays)
             
         """
-        R = 6371.0  # Radio de la Tierra en km
-        
-        # Convertir a radianes
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        
-        # Formula de Haversine
-        a = math.sin(dlat / 2)**2 + \
-            math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        distancia = R * c
-        
-        return distancia
+        if any(isinstance(v, np.ndarray) for v in (lat1, lon1, lat2, lon2)):
+            lat1_rad = np.radians(lat1)
+            lat2_rad = np.radians(lat2)
+            sin_dlat = np.sin(np.radians(np.subtract(lat2, lat1)) / 2)
+            sin_dlon = np.sin(np.radians(np.subtract(lon2, lon1)) / 2)
+            a = sin_dlat * sin_dlat + np.cos(lat1_rad) * np.cos(lat2_rad) * sin_dlon * sin_dlon
+            # Forma arcsin: una sola raiz en lugar de atan2(sqrt(a), sqrt(1 - a))
+            return DIAMETRO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        
+        # Formula de Haversine (nucleo compilado si hay numba)
+        return _haversine_km(lat1, lon1, lat2, lon2)
     
     def validar_instrucciones(self, instrucciones: List[InstruccionRuta], 
                               distancia_total_esperada: Optional[float] = None) -> Dict[str, Any]:
@@ -391,34 +577,44 @@ class GeneradorGuiaRuta:
         if not instrucciones:
             return {'valido': False, 'mensaje': 'No hay instrucciones para validar'}
         
+        # Campos extraidos una sola vez en arrays; cada verificacion es un ufunc
+        n = len(instrucciones)
+        pasos = np.fromiter((inst.paso for inst in instrucciones), dtype=np.int64, count=n)
+        lats = np.fromiter((inst.lat_origen for inst in instrucciones), dtype=np.float64, count=n)
+        lons = np.fromiter((inst.lon_origen for inst in instrucciones), dtype=np.float64, count=n)
+        distancias = np.fromiter((inst.distancia_km for inst in instrucciones), dtype=np.float64, count=n)
+        
         # Verificar secuencia continua de pasos
-        for i, inst in enumerate(instrucciones):
-            if inst.paso != i + 1:
-                return {
-                    'valido': False, 
-                    'mensaje': f"Secuencia de pasos incorrecta en paso {inst.paso}"
-                }
+        fuera_de_orden = np.flatnonzero(pasos != np.arange(1, n + 1))
+        if fuera_de_orden.size:
+            return {
+                'valido': False, 
+                'mensaje': f"Secuencia de pasos incorrecta en paso {instrucciones[fuera_de_orden[0]].paso}"
+            }
         
         # Verificar que coordenadas estan en rango valido (Lima)
         LIMA_LAT_MIN, LIMA_LAT_MAX = -12.5, -11.5
         LIMA_LON_MIN, LIMA_LON_MAX = -77.5, -76.5
         
-        for inst in instrucciones:
-            if not (LIMA_LAT_MIN <= inst.lat_origen <= LIMA_LAT_MAX):
+        lat_fuera = ~((lats >= LIMA_LAT_MIN) & (lats <= LIMA_LAT_MAX))
+        lon_fuera = ~((lons >= LIMA_LON_MIN) & (lons <= LIMA_LON_MAX))
+        for i in np.flatnonzero(lat_fuera | lon_fuera).tolist():
+            inst = instrucciones[i]
+            if lat_fuera[i]:
                 logger.warning(f"Latitud origen fuera de rango Lima en paso {inst.paso}")
-            if not (LIMA_LON_MIN <= inst.lon_origen <= LIMA_LON_MAX):
+            if lon_fuera[i]:
                 logger.warning(f"Longitud origen fuera de rango Lima en paso {inst.paso}")
         
         # Verificar que distancias son positivas
-        for inst in instrucciones:
-            if inst.distancia_km < 0:
-                return {
-                    'valido': False,
-                    'mensaje': f"Distancia negativa en paso {inst.paso}"
-                }
+        negativas = np.flatnonzero(distancias < 0)
+        if negativas.size:
+            return {
+                'valido': False,
+                'mensaje': f"Distancia negativa en paso {instrucciones[negativas[0]].paso}"
+            }
         
         # Calcular distancia total de instrucciones
-        distancia_total = sum(inst.distancia_km for inst in instrucciones)
+        distancia_total = float(distancias.sum())
         
         resultado = {
             'valido': True,
@@ -455,13 +651,8 @@ class GeneradorGuiaRuta:
         lineas.append(f"Total de Pasos: {len(instrucciones)}")
         lineas.append("")
         
-        for inst in instrucciones:
-            lineas.append(f"PASO {inst.paso}")
-            lineas.append(f"  Dirección: {inst.direccion}")
-            lineas.append(f"  Instrucción: {inst.instruccion}")
-            lineas.append(f"  Distancia: {inst.distancia_km:.2f} km")
-            lineas.append(f"  Desde nodo {inst.nodo_origen} → Hacia nodo {inst.nodo_destino}")
-            lineas.append("")
+        # Un bloque por paso (incluye la linea en blanco final) con una sola plantilla
+        lineas.extend(PLANTILLA_BLOQUE_PASO.format(inst=inst) for inst in instrucciones)
         
         lineas.append(f"FIN DE RUTA - Total: {total_distancia:.2f} km")
         
@@ -492,27 +683,31 @@ class GeneradorGuiaRuta:
         # Crear mapa
         mapa = folium.Map(location=center, zoom_start=13, tiles="OpenStreetMap")
         
-        # Coordenadas de la ruta completa
-        coordenadas_ruta = []
-        
-        # Agregar marcadores y construir polyline
+        # Coordenadas de la ruta completa: origen del primer paso y destino de cada
+        # paso, reunidas en dos arrays y convertidas a lista de pares de una vez
+        n = len(instrucciones)
+        lats = np.empty(n + 1)
+        lons = np.empty(n + 1)
+        lats[0] = instrucciones[0].lat_origen
+        lons[0] = instrucciones[0].lon_origen
+        lats[1:] = np.fromiter((inst.lat_destino for inst in instrucciones), dtype=np.float64, count=n)
+        lons[1:] = np.fromiter((inst.lon_destino for inst in instrucciones), dtype=np.float64, count=n)
+        coordenadas_ruta = np.column_stack((lats, lons)).tolist()
+        
+        # Marcadores reunidos en un FeatureGroup que se agrega al mapa una sola vez
+        marcadores = folium.FeatureGroup(name='Pasos')
+        ultimo = len(instrucciones) - 1
         for i, inst in enumerate(instrucciones):
-            # Agregar coordenada origen al path
-            if i == 0:
-                coordenadas_ruta.append([inst.lat_origen, inst.lon_origen])
-            
-            # Agregar coordenada destino
-            coordenadas_ruta.append([inst.lat_destino, inst.lon_destino])
-            
             # Marcador en cada punto de instruccion
-            color = 'green' if i == 0 else 'red' if i == len(instrucciones) - 1 else 'blue'
+            color = 'green' if i == 0 else 'red' if i == ultimo else 'blue'
             
-            folium.Marker(
+            marcadores.add_child(folium.Marker(
                 [inst.lat_destino, inst.lon_destino],
-                popup=f"<b>Paso {inst.paso}</b><br>{inst.direccion}<br>{inst.instruccion}",
-                tooltip=f"Paso {inst.paso}: {inst.direccion}",
+                popup=PLANTILLA_POPUP_PASO.format(inst=inst),
+                tooltip=PLANTILLA_TOOLTIP_PASO.format(inst=inst),
                 icon=folium.Icon(color=color, icon='info-sign')
-            ).add_to(mapa)
+            ))
+        marcadores.add_to(mapa)
         
         # Dibujar polyline de la ruta
         if len(coordenadas_ruta) > 1:
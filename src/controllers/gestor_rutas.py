@@ -2,14 +2,81 @@
 Gestor principal de rutas - Logica de negocio
 """
 
+import threading
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
 from itertools import combinations
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # scipy es opcional: sin él se usa la busqueda lineal vectorizada
+    cKDTree = None
+
 from ..models.vivero import Vivero
 from ..models.pedido import Pedido, Destino
 from ..models.ruta import Ruta
 from .calculador_rutas import CalculadorRutas
 from .validador import ValidadorRutas
+from ..utils.jit import NUMBA_DISPONIBLE, njit
+
+# Cache del nodo cercano: coordenadas redondeadas a 1e-5 grados (~1 m) y
+# tamaño acotado con politica LRU
+ESCALA_CACHE_NODO = 1e5
+MAX_CACHE_NODO = 4096
+
+# Rutas simples ya resueltas (LRU), por (origen, destinos ordenados, retorno, trafico)
+MAX_CACHE_RUTAS = 64
+
+# Histograma de duraciones por operacion: {nombre: {bucket: veces}}, donde el
+# bucket k agrupa las llamadas que tardaron entre 2^(k-1) y 2^k nanosegundos
+HISTOGRAMA_TIEMPOS: Dict[str, Counter] = defaultdict(Counter)
+
+
+@contextmanager
+def _perfil(nombre: str):
+    """Registra en HISTOGRAMA_TIEMPOS la duracion del bloque (o funcion decorada)"""
+    inicio = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        HISTOGRAMA_TIEMPOS[nombre][(time.perf_counter_ns() - inicio).bit_length()] += 1
+
+
+def _latlon_a_xyz(lat, lon):
+    """
+    Proyecta (lat, lon) en grados a la esfera unitaria (ECEF sin radio)
+    
+    La distancia euclidiana en 3D (la cuerda) crece con la distancia de gran
+    circulo, asi que el vecino mas cercano en xyz es el mas cercano sobre la
+    Tierra. Acepta escalares o arrays.
+    
+    Returns:
+        Tupla (x, y, z)
+    """
+    lat_rad = np.radians(lat)
+    lon_rad = np.radians(lon)
+    cos_lat = np.cos(lat_rad)
+    return cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)
+
+
+@njit(cache=True)
+def _indice_nodo_cercano(x, y, z, xs, ys, zs):
+    """Indice del punto con menor cuerda al cuadrado (el primero si hay empate)"""
+    mejor_indice = 0
+    mejor_d2 = np.inf
+    for i in range(xs.shape[0]):
+        dx = x - xs[i]
+        dy = y - ys[i]
+        dz = z - zs[i]
+        d2 = dx * dx + dy * dy + dz * dz
+        if d2 < mejor_d2:
+            mejor_d2 = d2
+            mejor_indice = i
+    return mejor_indice
 
 
 class GestorRutas:
@@ -23,13 +90,15 @@ class GestorRutas:
             nodos_coords: Diccionario {nodo_id: (lat, lon)} para busqueda espacial
         """
         self.grafo = grafo
-        self.calculador = CalculadorRutas(grafo, factor_trafico)
+        self.calculador = CalculadorRutas(grafo, factor_trafico, nodos_coords)
         self.nodos_coords = nodos_coords or {}  # Almacenar coordenadas en gestor
+        self._construir_indice_espacial()
         self.validador = ValidadorRutas()
         
         self.viveros: Dict[int, Vivero] = {}
-        self.pedidos: Dict[int, Pedido] = {}
-        self.rutas: Dict[int, Ruta] = {}
+        # Ids secuenciales desde 1: el pedido/ruta con id k esta en la posicion k - 1
+        self.pedidos: List[Pedido] = []
+        self.rutas: List[Ruta] = []
         
         self.vivero_actual: Optional[Vivero] = None
         self.pedido_actual: Optional[Pedido] = None
@@ -40,6 +109,46 @@ class GestorRutas:
         self.viveros_seleccionados_ids: List[int] = []  # viveros que el usuario seleccionó como orígenes (se usan como suplementarios automáticamente)
         self.validacion_por_simulacion: bool = False
         self.asignaciones_reabastecimiento: Optional[Dict] = None  # Guarda qué viveros reabasten cada destino
+        self._tour_cache: Optional[List[int]] = None  # Secuencia de la ultima ruta simple (origen + destinos)
+        self._tour_retorna: bool = True
+        self.ruta_vigente: bool = False  # True si ruta_actual refleja los destinos actuales
+        self._lock_ruta = threading.RLock()  # Protege el reemplazo de ruta_actual
+        self._hilo_mejora: Optional[threading.Thread] = None  # 2-opt en segundo plano
+        # Listas de dicts para la UI, reconstruidas solo cuando cambian viveros/destinos
+        self._cache_viveros_dicts: Optional[List[Dict]] = None
+        self._cache_destinos_dicts: Optional[Tuple[Tuple[int, int], List[Dict]]] = None
+        # Totales para validar agregar_destino: demanda del pedido por version y
+        # (capacidad, stock) por lista de proveedores; se invalidan como los de la UI
+        self._cache_demanda: Optional[Tuple[Tuple[int, int], Counter]] = None
+        self._cache_proveedores: Optional[Tuple[Tuple[int, ...], int, Counter]] = None
+        # Proveedores (origen + seleccionados); cambia solo al elegir o registrar viveros
+        self._cache_supplier_ids: Optional[List[int]] = None
+        self._cache_rutas: OrderedDict = OrderedDict()
+    
+    def _construir_indice_espacial(self):
+        """
+        Prepara arrays paralelos (SoA) de ids y coordenadas de los nodos del grafo
+        que tienen coordenadas, para que la busqueda del nodo cercano sea una sola
+        pasada vectorizada. El orden es el de self.grafo, como en el recorrido original.
+        """
+        nodos_coords = self.nodos_coords
+        ids = [nodo_id for nodo_id in self.grafo if nodo_id in nodos_coords]
+        self._coords_ids = np.array(ids, dtype=np.int64)
+        lats = np.fromiter((nodos_coords[n][0] for n in ids), dtype=np.float64, count=len(ids))
+        lons = np.fromiter((nodos_coords[n][1] for n in ids), dtype=np.float64, count=len(ids))
+        
+        # Coordenadas cartesianas sobre la esfera: la distancia euclidiana ordena
+        # los nodos igual que la de gran circulo, sin aproximar la longitud
+        self._coords_x, self._coords_y, self._coords_z = _latlon_a_xyz(lats, lons)
+        
+        # KD-tree sobre (x, y, z): consulta del nodo cercano en O(log N)
+        self._cache_nodo_cercano: OrderedDict = OrderedDict()
+        self._kdtree = None
+        if cKDTree is not None and len(ids) > 0:
+            self._kdtree = cKDTree(np.column_stack((self._coords_x, self._coords_y, self._coords_z)))
+        elif NUMBA_DISPONIBLE and len(ids) > 0:
+            # Sin scipy: compilar ya el recorrido lineal para no pagarlo en la primera consulta
+            _indice_nodo_cercano(0.0, 0.0, 0.0, self._coords_x, self._coords_y, self._coords_z)
     
     def registrar_vivero(self, vivero: Vivero) -> bool:
         """
@@ -53,6 +162,9 @@ class GestorRutas:
         """
         # Allow registration even if nodo_id not yet in grafo (nodo_id may be -1 until associated)
         self.viveros[vivero.vivero_id] = vivero
+        self._cache_viveros_dicts = None
+        self._cache_proveedores = None
+        self._cache_supplier_ids = None
         return True
     
     def seleccionar_vivero(self, vivero_id: int) -> Tuple[bool, Optional[str]]:
@@ -69,13 +181,14 @@ class GestorRutas:
             return False, f"El vivero {vivero_id} no existe"
         
         self.vivero_actual = self.viveros[vivero_id]
+        self._cache_supplier_ids = None
         
         # SOLO crear nuevo pedido si NO existe uno activo
         # Esto permite cambiar el vivero de origen sin perder los destinos agregados
         if self.pedido_actual is None:
             pedido_id = len(self.pedidos) + 1
             self.pedido_actual = Pedido(pedido_id, vivero_id)
-            self.pedidos[pedido_id] = self.pedido_actual
+            self.pedidos.append(self.pedido_actual)
         else:
             # Actualizar el vivero de origen del pedido existente
             self.pedido_actual.vivero_origen_id = vivero_id
@@ -101,76 +214,41 @@ class GestorRutas:
         if self.vivero_actual is None:
             return False, "Debe seleccionar y confirmar un vivero activo como origen antes de agregar destinos"
         
-        # Validar coordenadas
-        valido, error = self.validador.validar_rango_geografico_lima(lat, lon)
-        if not valido:
-            return False, error
-        
-        # Validar cantidad de destinos
         if self.pedido_actual is None:
             return False, "No hay un pedido activo"
-        cantidad_actual = self.pedido_actual.cantidad_destinos()
-        valido, error = self.validador.validar_cantidad_destinos(cantidad_actual + 1)
-        if not valido:
-            return False, error
         
-        # Construir lista de proveedores ordenada: origen activo primero,
-        # luego los seleccionados (que actúan automáticamente como suplementarios)
-        supplier_ids = [self.vivero_actual.vivero_id]
-        for vid in self.viveros_seleccionados_ids:
-            if vid != self.vivero_actual.vivero_id and vid in self.viveros and vid not in supplier_ids:
-                supplier_ids.append(vid)
+        # Proveedores: origen activo primero, luego los seleccionados
+        supplier_ids = self._obtener_supplier_ids()
 
-        # Verificar capacidad agregada (suma de capacidades de los viveros seleccionados)
-        capacidad_total = 0
-        for vid in supplier_ids:
-            v = self.viveros.get(vid)
-            if v and isinstance(v.capacidad_entrega, int):
-                capacidad_total += v.capacidad_entrega
+        # Capacidad agregada (suma de capacidades de los viveros seleccionados)
+        capacidad_total, stock_proveedores = self._totales_proveedores(supplier_ids)
+
+        # Stock acumulado para TODOS los destinos (existentes + nuevo). Si la
+        # validacion por simulacion esta activada, se OMITE esta validacion temprana
+        # y se delega la comprobacion a la simulacion que puede combinar suplentes.
+        demanda_total = None
+        stock_acumulado = None
+        if not self.validacion_por_simulacion:
+            # Demanda total por tipo de flor incluyendo el nuevo destino: solo
+            # se suman las flores del destino nuevo a la demanda ya acumulada
+            demanda_total = self._demanda_pedido().copy()
+            demanda_total.update(flores_requeridas)
+            stock_acumulado = stock_proveedores
 
-        valido, error = self.validador.validar_capacidad_entrega(
-            self.pedido_actual.cantidad_destinos() + 1,
-            capacidad_total
+        # Coordenadas, cantidad, capacidad, stock y nodo en una sola validacion.
+        # El nodo solo se comprueba si lo dio el llamador: el que devuelve la
+        # busqueda del nodo cercano siempre pertenece al grafo
+        valido, error = self.validador.validar_destino_completo(
+            lat, lon, self.pedido_actual.cantidad_destinos() + 1, capacidad_total,
+            demanda_total, stock_acumulado, nodo_id, self.grafo
         )
         if not valido:
             return False, error
 
-        # Validar stock acumulado para TODOS los destinos (existentes + nuevo)
-        # Calcular demanda total por tipo de flor incluyendo el nuevo destino
-        demanda_total = {}
-        for d in self.pedido_actual.destinos:
-            for flor, cant in d.flores_requeridas.items():
-                demanda_total[flor] = demanda_total.get(flor, 0) + int(cant)
-        for flor, cant in flores_requeridas.items():
-            demanda_total[flor] = demanda_total.get(flor, 0) + int(cant)
-
-        # Calcular stock acumulado en el orden de visita previsto (origen primero)
-        stock_acumulado = {}
-        for vid in supplier_ids:
-            v = self.viveros.get(vid)
-            if not v:
-                continue
-            for flor, cant in v.inventario.stock.items():
-                stock_acumulado[flor] = stock_acumulado.get(flor, 0) + max(0, int(cant))
-
-        # Validar que para cada tipo de flor la suma acumulada sea >= demanda total
-        # Si la validacion por simulacion esta activada, OMITIMOS esta validacion temprana
-        # y delegamos la comprobacion a la simulacion que puede combinar suplentes.
-        if not self.validacion_por_simulacion:
-            for flor, req_total in demanda_total.items():
-                disponible = stock_acumulado.get(flor, 0)
-                if disponible < req_total:
-                    return False, f"Stock insuficiente de {flor}: disponible={disponible}, requerido={req_total}.\nAsegure selección de viveros suplementarios que sumen el stock necesario y confirme el origen activo."
-
         # Si no se proporciono nodo_id, buscar el mas cercano
         if nodo_id is None:
             nodo_id = self._buscar_nodo_cercano(lat, lon)
 
-        # Validar que el nodo existe
-        valido, error = self.validador.validar_nodo_existe(nodo_id, self.grafo)
-        if not valido:
-            return False, error
-
         # Crear destino (antes de la simulacion)
         self.contador_destinos += 1
         destino = Destino(
@@ -210,6 +288,7 @@ class GestorRutas:
                 if not v:
                     continue
                 v.inventario.reducir_stock(consumos)
+                self._cache_proveedores = None
 
             # Elegir entregador: preferir origen si aporto algo, sino el primer proveedor que aporto
             delivering_vid = None
@@ -238,13 +317,121 @@ class GestorRutas:
             dv = self.viveros.get(delivering_vid)
             if dv and isinstance(dv.capacidad_entrega, int):
                 dv.capacidad_entrega = max(0, dv.capacidad_entrega - 1)
+                self._cache_viveros_dicts = None
+                self._cache_proveedores = None
 
         # Si el vivero se quedo sin stock de algun tipo, dejar marcado para UI
         # (la UI puede pedir al usuario seleccionar un vivero suplementario)
-        # self._recalcular_ruta_automatico()  # Desactivado: usuario calculará manualmente
+        # Ruta ya calculada: insertar el destino sin resolver el TSP de nuevo
+        self._actualizar_ruta_incremental(nodo_agregado=nodo_id)
         
         return True, None
     
+    def agregar_destinos_batch(self, coords: np.ndarray, flores: List[Dict[str, int]],
+                               detener_en_error: bool = False) -> List[Tuple[bool, Optional[str]]]:
+        """
+        Agrega varios destinos de una vez (importacion masiva)
+        
+        El rango geografico se valida con una mascara sobre todo el lote y los
+        nodos cercanos se buscan en una sola consulta; cada fila valida pasa
+        luego por agregar_destino, que conserva las validaciones de cantidad,
+        capacidad y stock en el orden del lote.
+        
+        Args:
+            coords: Array (N, 2) de (lat, lon)
+            flores: Lista de N diccionarios {tipo_flor: cantidad}
+            detener_en_error: Si True, no agrega las filas posteriores a la primera rechazada
+            
+        Returns:
+            Lista de tuplas (exito, mensaje_error), una por fila procesada
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) != len(flores):
+            raise ValueError("coords y flores deben tener la misma cantidad de filas")
+        if self.vivero_actual is None:
+            # Mismo rechazo que agregar_destino, sin buscar nodos
+            return [self.agregar_destino(lat, lon, f) for (lat, lon), f in zip(coords.tolist(), flores)]
+        
+        lats = coords[:, 0]
+        lons = coords[:, 1]
+        en_rango = ((lats >= ValidadorRutas.LAT_MIN) & (lats <= ValidadorRutas.LAT_MAX) &
+                    (lons >= ValidadorRutas.LON_MIN) & (lons <= ValidadorRutas.LON_MAX))
+        
+        nodos = np.full(len(coords), -1, dtype=np.int64)
+        if en_rango.any():
+            nodos[en_rango] = self._buscar_nodos_cercanos(lats[en_rango], lons[en_rango])
+        
+        resultados = []
+        for lat, lon, f, valido, nodo in zip(lats.tolist(), lons.tolist(), flores,
+                                             en_rango.tolist(), nodos.tolist()):
+            if not valido:
+                # Mensaje de error detallado solo para las filas rechazadas
+                resultados.append(self.validador.validar_rango_geografico_lima(lat, lon))
+            else:
+                resultados.append(self.agregar_destino(lat, lon, f, nodo_id=nodo))
+            if detener_en_error and not resultados[-1][0]:
+                break
+        return resultados
+    
+    def _obtener_supplier_ids(self) -> List[int]:
+        """
+        Lista de proveedores ordenada: origen activo primero, luego los
+        seleccionados (que actuan automaticamente como suplementarios).
+        Se reconstruye solo tras seleccionar o registrar viveros
+        
+        Returns:
+            IDs de los viveros proveedores; la lista no debe modificarse
+        """
+        if self._cache_supplier_ids is None:
+            supplier_ids = [self.vivero_actual.vivero_id]
+            for vid in self.viveros_seleccionados_ids:
+                if vid != self.vivero_actual.vivero_id and vid in self.viveros and vid not in supplier_ids:
+                    supplier_ids.append(vid)
+            self._cache_supplier_ids = supplier_ids
+        return self._cache_supplier_ids
+    
+    def _totales_proveedores(self, supplier_ids: List[int]) -> Tuple[int, Counter]:
+        """
+        Capacidad de entrega y stock sumados de los proveedores, reutilizados
+        mientras no cambien la lista, el stock ni las capacidades
+        
+        Args:
+            supplier_ids: IDs de los viveros proveedores (origen primero)
+            
+        Returns:
+            Tupla (capacidad_total, stock_acumulado); el Counter no debe modificarse
+        """
+        clave = tuple(supplier_ids)
+        if self._cache_proveedores is None or self._cache_proveedores[0] != clave:
+            capacidad_total = 0
+            # +Counter descarta cantidades negativas de cada vivero
+            stock_acumulado = Counter()
+            for vid in supplier_ids:
+                v = self.viveros.get(vid)
+                if not v:
+                    continue
+                if isinstance(v.capacidad_entrega, int):
+                    capacidad_total += v.capacidad_entrega
+                stock_acumulado.update(+Counter(v.inventario.stock))
+            self._cache_proveedores = (clave, capacidad_total, stock_acumulado)
+        return self._cache_proveedores[1], self._cache_proveedores[2]
+    
+    def _demanda_pedido(self) -> Counter:
+        """
+        Demanda por tipo de flor de los destinos del pedido actual, recalculada
+        solo cuando cambia la version del pedido
+        
+        Returns:
+            Counter {tipo_flor: cantidad}; no debe modificarse
+        """
+        clave = (id(self.pedido_actual), self.pedido_actual._version)
+        if self._cache_demanda is None or self._cache_demanda[0] != clave:
+            demanda = Counter()
+            for d in self.pedido_actual.destinos:
+                demanda.update(d.flores_requeridas)
+            self._cache_demanda = (clave, demanda)
+        return self._cache_demanda[1]
+    
     def editar_destino(self, destino_id: int, nueva_lat: float, nueva_lon: float) -> Tuple[bool, Optional[str]]:
         """
         Edita las coordenadas de un destino (RF-02)
@@ -273,12 +460,14 @@ class GestorRutas:
         if destino is None:
             return False, f"Destino {destino_id} no encontrado"
         
+        nodo_anterior = destino.nodo_id
         destino.lat = nueva_lat
         destino.lon = nueva_lon
         destino.nodo_id = nuevo_nodo_id
+        self.pedido_actual._version += 1
         
-        # Recalcular ruta automaticamente
-        # self._recalcular_ruta_automatico()  # Desactivado: usuario calculará manualmente
+        # Actualizar la ruta: quitar el nodo anterior y reinsertar el nuevo
+        self._actualizar_ruta_incremental(nodo_agregado=nuevo_nodo_id, nodo_quitado=nodo_anterior)
         
         return True, None
     
@@ -299,14 +488,16 @@ class GestorRutas:
         # La validación de rango para calcular ruta seguirá requiriendo entre 1 y 20 destinos.
         
         # Eliminar del pedido
-        if not self.pedido_actual.eliminar_destino(destino_id):
+        destino = self.pedido_actual.obtener_destino(destino_id)
+        if destino is None or not self.pedido_actual.eliminar_destino(destino_id):
             return False, f"Destino {destino_id} no encontrado"
         
-        # Recalcular ruta automaticamente si quedan destinos
-        # self._recalcular_ruta_automatico()  # Desactivado: usuario calculará manualmente
+        # Actualizar la ruta si quedan destinos (quitar la parada y mejorar con 2-opt)
+        self._actualizar_ruta_incremental(nodo_quitado=destino.nodo_id)
         
         return True, None
     
+    @_perfil('calcular_ruta_optima')
     def calcular_ruta_optima(self, retornar_origen: bool = True) -> Tuple[bool, Optional[str]]:
         """
         Calcula la ruta optima para el pedido actual (RF-03)
@@ -327,13 +518,14 @@ class GestorRutas:
         destinos_nodos = [d.nodo_id for d in self.pedido_actual.destinos]
         origen_nodo = self.vivero_actual.nodo_id
         
+        # Matriz de la ruta (None: la vigente del calculador) y si se lanza el 2-opt
+        indice = matriz = None
+        refinar = False
+        
         # Si la validación por simulación está activa, recalcular asignaciones con TODOS los destinos
         if self.validacion_por_simulacion:
             # Construir lista de supplier_ids (origen + seleccionados)
-            supplier_ids = [self.vivero_actual.vivero_id]
-            for vid in self.viveros_seleccionados_ids:
-                if vid != self.vivero_actual.vivero_id and vid in self.viveros and vid not in supplier_ids:
-                    supplier_ids.append(vid)
+            supplier_ids = self._obtener_supplier_ids()
             
             # Recalcular simulación con TODOS los destinos actuales
             sim_ok, sim_res = self._simular_entregas_con_reabastecimiento(
@@ -402,62 +594,248 @@ class GestorRutas:
             self.calculador.precalcular_matriz_distancias(list(nodos_visitados))
             
             # Calcular distancia total del recorrido
-            tiempo_inicio = time.time()
+            tiempo_inicio = time.perf_counter_ns()
             camino_completo, distancia_real = self.calculador.calcular_camino_completo(secuencia_completa)
             distancia_total = distancia_real
             secuencia = secuencia_completa
-            tiempo_fin = time.time()
+            tiempo_fin = time.perf_counter_ns()
+            # El orden lo define la simulacion: no hay recorrido para actualizar por partes
+            tour = None
         else:
-            # Ruta simple: solo origen y destinos
-            nodos_interes = [origen_nodo] + destinos_nodos
-            self.calculador.precalcular_matriz_distancias(nodos_interes)
-            
-            tiempo_inicio = time.time()
-            distancia_total, secuencia = self.calculador.calcular_ruta_tsp(
-                origen_nodo,
-                destinos_nodos,
-                retornar_origen
-            )
-            tiempo_fin = time.time()
-            
-            # Calcular camino completo nodo por nodo
-            camino_completo, distancia_real = self.calculador.calcular_camino_completo(secuencia)
+            # Ruta simple: solo origen y destinos. El mismo conjunto de nodos
+            # (en cualquier orden) reutiliza la ruta ya resuelta
+            clave = (origen_nodo, tuple(sorted(destinos_nodos)), bool(retornar_origen),
+                     self.calculador.factor_trafico)
+            resuelta = self._cache_rutas.get(clave)
+            if resuelta is not None:
+                self._cache_rutas.move_to_end(clave)
+                tiempo_inicio = time.perf_counter_ns()
+                secuencia, camino_completo, distancia_real, indice, matriz = resuelta
+                tiempo_fin = time.perf_counter_ns()
+            else:
+                nodos_interes = [origen_nodo] + destinos_nodos
+                self.calculador.precalcular_matriz_distancias(nodos_interes)
+                
+                tiempo_inicio = time.perf_counter_ns()
+                # El recorrido anterior sirve de punto de partida si difiere en un destino
+                distancia_total, secuencia = self.calculador.calcular_ruta_tsp(
+                    origen_nodo,
+                    destinos_nodos,
+                    retornar_origen,
+                    tour_inicial=self._tour_cache
+                )
+                tiempo_fin = time.perf_counter_ns()
+                
+                # Calcular camino completo nodo por nodo
+                camino_completo, distancia_real = self.calculador.calcular_camino_completo(secuencia)
+                indice = self.calculador.indice_interes
+                matriz = self.calculador.matriz_densa
+                # Held-Karp es exacto: 2-opt solo puede mejorar un recorrido reparado
+                refinar = self.calculador.tsp_heuristico
+                # Un recorrido reparado no se guarda: el cache solo devuelve
+                # recorridos exactos y no una version previa al 2-opt
+                if not refinar:
+                    self._cache_rutas[clave] = (secuencia, camino_completo, distancia_real,
+                                                indice, matriz)
+                    if len(self._cache_rutas) > MAX_CACHE_RUTAS:
+                        self._cache_rutas.popitem(last=False)
+            tour = list(secuencia)
+        
+        # Recorrido y ruta actual cambian juntos: el hilo de 2-opt no puede
+        # intercalarse entre ambos y guardar un recorrido anterior
+        with self._lock_ruta:
+            self._tour_cache = tour
+            self._tour_retorna = retornar_origen
+            self._guardar_ruta(origen_nodo, secuencia, camino_completo, distancia_real,
+                               tiempo_fin - tiempo_inicio, indice, matriz)
+        if refinar:
+            self._iniciar_mejora_2opt(self.ruta_actual, retornar_origen)
+        return True, None
+    
+    def _guardar_ruta(self, origen_nodo: int, secuencia: List[int], camino_completo: List[int],
+                      distancia_real: float, tiempo_computo_ns: int,
+                      indice: Optional[Dict[int, int]] = None, matriz: Optional[np.ndarray] = None,
+                      ruta_id: Optional[int] = None):
+        """
+        Crea la Ruta con sus metricas por segmento y la deja como ruta actual
+        
+        Args:
+            origen_nodo: Nodo de inicio
+            secuencia: Orden de visita de los nodos
+            camino_completo: Camino nodo por nodo de toda la ruta
+            distancia_real: Distancia del camino completo en metros
+            tiempo_computo_ns: Nanosegundos empleados en calcular la ruta
+            indice: Posiciones de la matriz (por defecto, las del calculador)
+            matriz: Matriz densa de distancias (por defecto, la del calculador)
+            ruta_id: Reutilizar este id (ruta refinada) en lugar de uno nuevo
+        """
+        if indice is None:
+            indice = self.calculador.indice_interes
+            matriz = self.calculador.matriz_densa
+        if ruta_id is None:
+            self.contador_rutas += 1
+            ruta_id = self.contador_rutas
         
         # Crear objeto Ruta
-        self.contador_rutas += 1
         ruta = Ruta(
-            ruta_id=self.contador_rutas,
+            ruta_id=ruta_id,
             origen_nodo=origen_nodo,
             secuencia_visitas=secuencia,
             distancia_total=distancia_real / 1000,  # Convertir a km
             tiempo_total=distancia_real / 1000 / 0.5  # Asumir 30 km/h promedio
         )
         
-        ruta.tiempo_computo = tiempo_fin - tiempo_inicio
+        ruta.tiempo_computo_ns = tiempo_computo_ns
         ruta.camino_completo = camino_completo
         
-        # Calcular metricas por segmento
-        for i in range(len(secuencia) - 1):
-            desde = secuencia[i]
-            hasta = secuencia[i + 1]
-            dist_segmento = self.calculador.matriz_distancias.get((desde, hasta), 0) / 1000
-            tiempo_segmento = dist_segmento / 0.5
-            ruta.agregar_segmento(desde, hasta, dist_segmento, tiempo_segmento)
+        # Calcular metricas por segmento: distancias leidas de la matriz densa con
+        # indexado vectorizado (0 para pares fuera de los nodos precalculados)
+        posiciones = np.fromiter((indice.get(nodo, -1) for nodo in secuencia),
+                                 dtype=np.int64, count=len(secuencia))
+        desde_idx, hasta_idx = posiciones[:-1], posiciones[1:]
+        conocidos = (desde_idx >= 0) & (hasta_idx >= 0)
+        dist_segmentos = np.zeros(len(desde_idx))
+        dist_segmentos[conocidos] = matriz[desde_idx[conocidos], hasta_idx[conocidos]]
+        dist_segmentos /= 1000
+        tiempos_segmentos = dist_segmentos / 0.5
+        
+        ruta.agregar_segmentos_bulk(secuencia[:-1], secuencia[1:],
+                                    dist_segmentos.tolist(), tiempos_segmentos.tolist())
         
         # Guardar ruta
-        self.ruta_actual = ruta
-        self.rutas[ruta.ruta_id] = ruta
+        with self._lock_ruta:
+            self.ruta_actual = ruta
+            if ruta.ruta_id > len(self.rutas):
+                self.rutas.append(ruta)
+            else:
+                self.rutas[ruta.ruta_id - 1] = ruta  # Ruta refinada: conserva su id
+            self.ruta_vigente = True
+    
+    def _iniciar_mejora_2opt(self, ruta: Ruta, retorna: bool):
+        """
+        Lanza en segundo plano una pasada de 2-opt sobre la ruta recien calculada
+        cuando el TSP se resolvio reparando un recorrido previo (no exacto)
         
-        return True, None
+        Trabaja sobre la matriz y los arboles de padres vigentes en este momento
+        (el calculador reemplaza esos objetos en cada precalculo, no los modifica),
+        asi que el hilo no comparte estado mutable con nuevas consultas.
+        
+        Args:
+            ruta: Ruta a refinar
+            retorna: True si la ruta vuelve al origen
+        """
+        self._hilo_mejora = threading.Thread(
+            target=self._refinar_ruta_2opt,
+            args=(ruta, list(ruta.secuencia_visitas), retorna, self.calculador.indice_interes,
+                  self.calculador.matriz_densa, self.calculador.padres_interes,
+                  self.calculador.rango_interes),
+            daemon=True
+        )
+        self._hilo_mejora.start()
+    
+    def _refinar_ruta_2opt(self, ruta: Ruta, secuencia: List[int], retorna: bool,
+                           indice: Dict[int, int], matriz: np.ndarray, padres_interes: Dict,
+                           rango_interes: Optional[Dict[int, int]]):
+        """
+        Cuerpo del hilo de mejora: si 2-opt acorta el recorrido, reemplaza la ruta
+        actual, salvo que entretanto se haya calculado o modificado otra
+        
+        Args:
+            ruta: Ruta a refinar
+            secuencia: Orden de visita de la ruta
+            retorna: True si la ruta vuelve al origen
+            indice: Posiciones de la matriz
+            matriz: Matriz densa de distancias entre nodos de interes
+            padres_interes: Arboles de padres de cada nodo de interes
+            rango_interes: Orden de llegada al pool de cada nodo (None: sin pool)
+        """
+        mejorada = self.calculador.mejorar_2opt(secuencia, retorna, indice, matriz)
+        if mejorada == secuencia:
+            return
+        
+        # Camino nodo por nodo con los arboles de padres capturados
+        calculador = self.calculador
+        camino_completo = []
+        distancia_real = 0.0
+        for desde, hasta in zip(mejorada, mejorada[1:]):
+            camino = calculador.camino_interes(desde, hasta, padres_interes, rango_interes)
+            if camino is None:
+                return
+            camino_completo.extend(camino[1:] if camino_completo else camino)
+            distancia_real += float(matriz[indice[desde], indice[hasta]])
+        
+        with self._lock_ruta:
+            if self.ruta_actual is not ruta or not self.ruta_vigente:
+                return
+            self._guardar_ruta(ruta.origen_nodo, mejorada, camino_completo, distancia_real,
+                               ruta.tiempo_computo_ns, indice, matriz, ruta.ruta_id)
+            self._tour_cache = mejorada
     
-    def _recalcular_ruta_automatico(self):
-        """Recalcula la ruta automaticamente al modificar destinos"""
-        if self.pedido_actual and self.pedido_actual.cantidad_destinos() > 0:
-            self.calcular_ruta_optima()
+    @_perfil('actualizar_ruta_incremental')
+    def _actualizar_ruta_incremental(self, nodo_agregado: Optional[int] = None,
+                                     nodo_quitado: Optional[int] = None):
+        """
+        Actualiza la ruta actual tras agregar, editar o eliminar un destino sin
+        volver a resolver el TSP completo
+        
+        Inserciones por menor costo (cheapest insertion) y eliminaciones por
+        empalme seguido de 2-opt, usando la matriz entre nodos de interes. Solo
+        aplica a la ultima ruta simple calculada desde el origen actual; con
+        reabastecimiento el orden lo define la simulacion y la ruta deja de
+        estar vigente hasta que el usuario la recalcule.
+        
+        Args:
+            nodo_agregado: Nodo del destino nuevo (o nueva ubicacion al editar)
+            nodo_quitado: Nodo del destino eliminado (o ubicacion anterior al editar)
+        """
+        with self._lock_ruta:
+            tour = self._tour_cache
+            if (tour is None or self.ruta_actual is None or self.asignaciones_reabastecimiento
+                    or self.vivero_actual is None or tour[0] != self.vivero_actual.nodo_id):
+                self.ruta_vigente = False
+                return
+        
+        tiempo_inicio = time.perf_counter_ns()
+        origen = tour[0]
+        retorna = self._tour_retorna
+        paradas = tour[1:-1] if retorna else tour[1:]
+        
+        # Quitar la parada solo si ningun otro destino sigue en ese nodo
+        nodos_pedido = {d.nodo_id for d in self.pedido_actual.destinos}
+        quitado = nodo_quitado is not None and nodo_quitado not in nodos_pedido and nodo_quitado in paradas
+        if quitado:
+            paradas.remove(nodo_quitado)
+        insertar = nodo_agregado is not None and nodo_agregado != origen and nodo_agregado not in paradas
+        
+        if not paradas and not insertar:
+            # Sin destinos no hay ruta que mostrar
+            with self._lock_ruta:
+                self._tour_cache = None
+                self.ruta_vigente = False
+            return
+        
+        # Matriz entre los nodos de la ruta (cacheada por el calculador)
+        nodos = [origen] + paradas + ([nodo_agregado] if insertar else [])
+        self.calculador.precalcular_matriz_distancias(nodos)
+        indice = self.calculador.indice_interes
+        matriz = self.calculador.matriz_densa
+        
+        secuencia = [origen] + paradas + ([origen] if retorna else [])
+        if quitado:
+            secuencia = self.calculador.mejorar_2opt(secuencia, retorna, indice, matriz)
+        if insertar:
+            secuencia = self.calculador.insertar_menor_costo(secuencia, nodo_agregado, retorna, indice, matriz)
+        
+        camino_completo, distancia_real = self.calculador.calcular_camino_completo(secuencia)
+        with self._lock_ruta:
+            self._tour_cache = secuencia
+            self._guardar_ruta(origen, secuencia, camino_completo, distancia_real,
+                               time.perf_counter_ns() - tiempo_inicio)
     
     def _buscar_nodo_cercano(self, lat: float, lon: float) -> int:
         """
-        Busca el nodo mas cercano a unas coordenadas usando distancia euclidiana
+        Busca el nodo mas cercano a unas coordenadas por distancia sobre la esfera
+        (memorizado por coordenadas redondeadas a ~1 m)
         
         Args:
             lat: Latitud
@@ -469,31 +847,70 @@ class GestorRutas:
         if not self.grafo:
             raise ValueError("Grafo no inicializado")
         
-        # Usar coordenadas almacenadas en el gestor
-        nodos_coords = self.nodos_coords
+        # Un marcador movido apenas (o el mismo punto) reutiliza la busqueda previa
+        clave = (round(lat * ESCALA_CACHE_NODO), round(lon * ESCALA_CACHE_NODO))
+        cache = self._cache_nodo_cercano
+        if clave in cache:
+            cache.move_to_end(clave)
+            return cache[clave]
         
-        mejor_nodo = None
-        mejor_distancia = float('inf')
+        nodo = self._buscar_nodo_cercano_sin_cache(lat, lon)
+        cache[clave] = nodo
+        if len(cache) > MAX_CACHE_NODO:
+            cache.popitem(last=False)
+        return nodo
+    
+    def _buscar_nodo_cercano_sin_cache(self, lat: float, lon: float) -> int:
+        """
+        Busqueda espacial del nodo mas cercano (KD-tree o pasada vectorizada)
         
-        # Buscar nodo más cercano
-        for nodo_id in self.grafo.keys():
-            if nodo_id not in nodos_coords:
-                continue
-            
-            nodo_lat, nodo_lon = nodos_coords[nodo_id]
-            
-            # Distancia euclidiana (aproximación)
-            distancia = ((lat - nodo_lat) ** 2 + (lon - nodo_lon) ** 2) ** 0.5
+        Args:
+            lat: Latitud
+            lon: Longitud
             
-            if distancia < mejor_distancia:
-                mejor_distancia = distancia
-                mejor_nodo = nodo_id
-        
-        if mejor_nodo is None:
+        Returns:
+            ID del nodo mas cercano que existe en el grafo
+        """
+        if len(self._coords_ids) == 0:
             # Fallback: retornar primer nodo del grafo
             return next(iter(self.grafo.keys()))
         
-        return mejor_nodo
+        x, y, z = _latlon_a_xyz(lat, lon)
+        if self._kdtree is not None:
+            # Misma distancia (cuerda en 3D), resuelta con el KD-tree
+            _, indice = self._kdtree.query((x, y, z))
+            return int(self._coords_ids[indice])
+        
+        if NUMBA_DISPONIBLE:
+            # Recorrido lineal compilado, sin arrays temporales
+            indice = _indice_nodo_cercano(float(x), float(y), float(z),
+                                          self._coords_x, self._coords_y, self._coords_z)
+            return int(self._coords_ids[indice])
+        
+        # Cuerda al cuadrado a todos los nodos en una pasada (sin raiz: argmin
+        # es el mismo)
+        dx = x - self._coords_x
+        dy = y - self._coords_y
+        dz = z - self._coords_z
+        return int(self._coords_ids[np.argmin(dx * dx + dy * dy + dz * dz)])
+    
+    def _buscar_nodos_cercanos(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """
+        Nodo mas cercano para un lote de coordenadas
+        
+        Args:
+            lats: Latitudes
+            lons: Longitudes
+            
+        Returns:
+            Array con el ID del nodo mas cercano de cada punto
+        """
+        if self._kdtree is not None:
+            # Una sola consulta al KD-tree para todo el lote
+            _, indices = self._kdtree.query(np.column_stack(_latlon_a_xyz(lats, lons)))
+            return self._coords_ids[indices]
+        return np.array([self._buscar_nodo_cercano(lat, lon)
+                         for lat, lon in zip(lats.tolist(), lons.tolist())], dtype=np.int64)
     
     def obtener_resumen(self) -> Optional[Dict]:
         """
@@ -520,21 +937,33 @@ class GestorRutas:
         return self.ruta_actual.exportar_orden_visitas()
     
     def obtener_viveros_disponibles(self) -> List[Dict]:
-        """Retorna lista de viveros disponibles"""
-        return [
-            {
-                'vivero_id': v.vivero_id,
-                'nombre': v.nombre,
-                'lat': v.lat,
-                'lon': v.lon,
-                'capacidad': v.capacidad_entrega
-            }
-            for v in self.viveros.values()
-        ]
+        """
+        Retorna lista de viveros disponibles
+        
+        La lista se construye una vez y se reutiliza hasta que se registra un
+        vivero o cambia su capacidad; no debe modificarse desde fuera.
+        """
+        if self._cache_viveros_dicts is None:
+            self._cache_viveros_dicts = [
+                {
+                    'vivero_id': v.vivero_id,
+                    'nombre': v.nombre,
+                    'lat': v.lat,
+                    'lon': v.lon,
+                    'capacidad': v.capacidad_entrega
+                }
+                for v in self.viveros.values()
+            ]
+        return self._cache_viveros_dicts
+    
+    def iterar_viveros_disponibles(self) -> Iterator[Dict]:
+        """Recorre los viveros disponibles sin copiar la lista"""
+        yield from self.obtener_viveros_disponibles()
 
     def set_viveros_seleccionados(self, ids: List[int]) -> None:
         """Actualiza la lista de viveros seleccionados por el usuario"""
         self.viveros_seleccionados_ids = [vid for vid in ids if vid in self.viveros]
+        self._cache_supplier_ids = None
 
     def set_validacion_por_simulacion(self, value: bool) -> None:
         """Activa o desactiva la validacion por simulacion (reabastecimiento)"""
@@ -578,23 +1007,42 @@ class GestorRutas:
                 supplier_stocks[vid] = {}
                 supplier_nodes[vid] = -1
 
-        # Crear copia mutable del stock para simulacion
-        stocks_actuales = {sid: dict(supplier_stocks.get(sid, {})) for sid in supplier_ids}
-
-        # Verificar que existe stock total suficiente
-        demanda_total: Dict[str, int] = {}
+        # Indice de flores: primero las del pedido (en orden de aparicion) y
+        # luego las que solo estan en los inventarios
+        flor_indice: Dict[str, int] = {}
         for d in destinos:
-            for f, c in d.flores_requeridas.items():
-                demanda_total[f] = demanda_total.get(f, 0) + int(c)
-
-        stock_total: Dict[str, int] = {}
+            for f in d.flores_requeridas:
+                flor_indice.setdefault(f, len(flor_indice))
+        flores_pedido = len(flor_indice)
         for sid in supplier_ids:
-            for f, c in stocks_actuales.get(sid, {}).items():
-                stock_total[f] = stock_total.get(f, 0) + int(c)
+            for f in supplier_stocks[sid]:
+                flor_indice.setdefault(f, len(flor_indice))
+        nombres_flores = list(flor_indice)
 
-        for flor, demanda in demanda_total.items():
-            if stock_total.get(flor, 0) < demanda:
-                return False, f"Stock total insuficiente para flor '{flor}': disponible={stock_total.get(flor, 0)}, requerido={demanda}"
+        # Copia mutable del stock para la simulacion: matriz (proveedor x flor)
+        fila_de = {sid: i for i, sid in enumerate(supplier_ids)}
+        stock_mat = np.zeros((len(supplier_ids), len(flor_indice)), dtype=np.int64)
+        for sid, i in fila_de.items():
+            for f, c in supplier_stocks[sid].items():
+                stock_mat[i, flor_indice[f]] = c
+
+        # Flores y cantidades de cada destino como arrays de columnas
+        requeridas: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        demanda_total = np.zeros(len(flor_indice), dtype=np.int64)
+        for d in destinos:
+            columnas = np.fromiter((flor_indice[f] for f in d.flores_requeridas), dtype=np.int64,
+                                   count=len(d.flores_requeridas))
+            cantidades = np.fromiter((int(c) for c in d.flores_requeridas.values()), dtype=np.int64,
+                                     count=len(d.flores_requeridas))
+            requeridas[d.destino_id] = (columnas, cantidades)
+            np.add.at(demanda_total, columnas, cantidades)
+
+        # Verificar que existe stock total suficiente (flores del pedido)
+        stock_total = stock_mat.sum(axis=0)
+        faltantes = np.flatnonzero(stock_total[:flores_pedido] < demanda_total[:flores_pedido])
+        if len(faltantes):
+            k = int(faltantes[0])
+            return False, f"Stock total insuficiente para flor '{nombres_flores[k]}': disponible={int(stock_total[k])}, requerido={int(demanda_total[k])}"
 
         # Preparar nodos de destinos
         destinos_nodos = []
@@ -623,15 +1071,13 @@ class GestorRutas:
 
         # Simular entregas secuenciales
         for _, dest, nodo_dest in destinos_ordenados:
-            # Verificar si hay stock suficiente en vivero actual para este destino
-            stock_suficiente = True
-            for flor, cantidad in dest.flores_requeridas.items():
-                if stocks_actuales.get(vivero_actual_id, {}).get(flor, 0) < cantidad:
-                    stock_suficiente = False
-                    break
+            # Proveedores con stock suficiente para este destino, en una sola
+            # comparacion sobre las columnas de sus flores
+            columnas, cantidades = requeridas[dest.destino_id]
+            con_stock = np.all(stock_mat[:, columnas] >= cantidades, axis=1)
 
             # Si no hay stock suficiente, buscar vivero mas cercano con stock
-            if not stock_suficiente:
+            if not con_stock[fila_de[vivero_actual_id]]:
                 mejor_vivero = None
                 mejor_distancia = float('inf')
 
@@ -640,14 +1086,7 @@ class GestorRutas:
                     if sid == vivero_actual_id:
                         continue  # Ya sabemos que no tiene stock suficiente
 
-                    # Verificar si este vivero tiene stock suficiente para el destino
-                    tiene_stock = True
-                    for flor, cantidad in dest.flores_requeridas.items():
-                        if stocks_actuales.get(sid, {}).get(flor, 0) < cantidad:
-                            tiene_stock = False
-                            break
-
-                    if not tiene_stock:
+                    if not con_stock[fila_de[sid]]:
                         continue
 
                     # Calcular distancia desde posicion actual al vivero usando DIJKSTRA
@@ -668,10 +1107,10 @@ class GestorRutas:
                 viveros_visitados.append(mejor_vivero)
 
             # Realizar entrega desde vivero actual
-            asignaciones_resultado[dest.destino_id] = {vivero_actual_id: {}}
-            for flor, cantidad in dest.flores_requeridas.items():
-                asignaciones_resultado[dest.destino_id][vivero_actual_id][flor] = int(cantidad)
-                stocks_actuales[vivero_actual_id][flor] -= int(cantidad)
+            asignaciones_resultado[dest.destino_id] = {
+                vivero_actual_id: {flor: int(cantidad) for flor, cantidad in dest.flores_requeridas.items()}
+            }
+            stock_mat[fila_de[vivero_actual_id], columnas] -= cantidades
 
             # Actualizar posicion actual al destino recien visitado
             nodo_actual = nodo_dest
@@ -690,20 +1129,33 @@ class GestorRutas:
         return agotados
 
     def obtener_destinos_actuales(self) -> List[Dict]:
-        """Retorna lista de destinos del pedido actual"""
+        """
+        Retorna lista de destinos del pedido actual
+        
+        La lista se reutiliza mientras no cambien el pedido ni su version
+        (agregar, editar o eliminar destinos); no debe modificarse desde fuera.
+        """
         if self.pedido_actual is None:
             return []
         
-        return [
-            {
-                'destino_id': d.destino_id,
-                'nodo_id': d.nodo_id,
-                'lat': d.lat,
-                'lon': d.lon,
-                'flores': d.flores_requeridas
-            }
-            for d in self.pedido_actual.destinos
-        ]
+        clave = (id(self.pedido_actual), self.pedido_actual._version)
+        if self._cache_destinos_dicts is None or self._cache_destinos_dicts[0] != clave:
+            destinos = [
+                {
+                    'destino_id': d.destino_id,
+                    'nodo_id': d.nodo_id,
+                    'lat': d.lat,
+                    'lon': d.lon,
+                    'flores': d.flores_requeridas
+                }
+                for d in self.pedido_actual.destinos
+            ]
+            self._cache_destinos_dicts = (clave, destinos)
+        return self._cache_destinos_dicts[1]
+    
+    def iterar_destinos_actuales(self) -> Iterator[Dict]:
+        """Recorre los destinos del pedido actual sin copiar la lista"""
+        yield from self.obtener_destinos_actuales()
     
     def obtener_viveros_reabastecimiento(self) -> List[int]:
         """
@@ -0,0 +1,55 @@
+"""
+Modulo: held_karp_numba.py
+Descripcion: Tabla DP de Held-Karp por mascaras de bits compilada con Numba
+
+Cada capa de subconjuntos del mismo tamaño se reparte entre hilos con prange:
+los estados de una capa solo leen de la capa anterior, asi que no hay
+dependencias entre iteraciones.
+"""
+
+import numpy as np
+
+from ..utils.jit import njit, prange
+
+
+@njit(cache=True, parallel=True)
+def held_karp_dp(D, n, mascaras, limites):
+    """
+    Llena las tablas dp_dist/dp_prev de Held-Karp
+
+    Args:
+        D: Matriz (n + 1, n + 1); indices 0..n-1 son destinos y n el origen
+        n: Numero de destinos
+        mascaras: Todas las mascaras 0..2^n - 1 ordenadas por numero de bits
+        limites: mascaras[limites[s]:limites[s + 1]] son las de tamaño s
+
+    Returns:
+        Tupla (dp_dist, dp_prev) de forma (2^n, n); dp_prev = -1 indica el origen
+    """
+    dp_dist = np.full((1 << n, n), np.inf)
+    dp_prev = np.full((1 << n, n), -1, np.int16)
+
+    # Caso base: ir desde el origen a cada destino
+    for i in range(n):
+        dp_dist[1 << i, i] = D[n, i]
+
+    for tamano in range(2, n + 1):
+        for k in prange(limites[tamano], limites[tamano + 1]):
+            mascara = mascaras[k]
+            for ultimo in range(n):
+                if not (mascara >> ultimo) & 1:
+                    continue
+                mascara_prev = mascara ^ (1 << ultimo)
+                mejor = np.inf
+                mejor_prev = -1
+                # Minimo sobre los penultimos posibles del subconjunto previo
+                for p in range(n):
+                    if (mascara_prev >> p) & 1:
+                        candidato = dp_dist[mascara_prev, p] + D[p, ultimo]
+                        if candidato < mejor:
+                            mejor = candidato
+                            mejor_prev = p
+                dp_dist[mascara, ultimo] = mejor
+                dp_prev[mascara, ultimo] = mejor_prev
+
+    return dp_dist, dp_prev
@@ -2,7 +2,8 @@
 Validaciones para RF-02 y datos de entrada
 """
 
-from typing import Tuple, Optional
+from collections import Counter
+from typing import Dict, Tuple, Optional
 
 
 class ValidadorRutas:
@@ -147,3 +148,60 @@ class ValidadorRutas:
             return False, f"La cantidad de destinos ({cantidad_destinos}) excede la capacidad de entrega del vivero ({capacidad_maxima})"
         
         return True, None
+    
+    @staticmethod
+    def validar_destino_completo(lat: float, lon: float, cantidad_destinos: int,
+                                 capacidad_maxima: int, demanda_total: Optional[Dict[str, int]],
+                                 stock_acumulado: Optional[Dict[str, int]],
+                                 nodo_id: Optional[int], grafo: dict) -> Tuple[bool, Optional[str]]:
+        """
+        Todas las validaciones de un destino nuevo en una sola llamada, en el
+        orden de agregar_destino: coordenadas, cantidad, capacidad, stock y nodo
+        
+        Args:
+            lat: Latitud
+            lon: Longitud
+            cantidad_destinos: Numero de destinos del pedido incluyendo el nuevo
+            capacidad_maxima: Capacidad de entrega sumada de los viveros
+            demanda_total: {tipo_flor: cantidad} de todo el pedido (None omite el stock)
+            stock_acumulado: {tipo_flor: cantidad} sumada de los viveros
+            nodo_id: ID del nodo (None omite la comprobacion)
+            grafo: Diccionario de adyacencia del grafo
+            
+        Returns:
+            Tupla (es_valido, mensaje_error)
+        """
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            return False, "Las coordenadas deben ser numeros"
+        if not (-90 <= lat <= 90):
+            return False, f"Latitud fuera de rango: {lat}. Debe estar entre -90 y 90"
+        if not (-180 <= lon <= 180):
+            return False, f"Longitud fuera de rango: {lon}. Debe estar entre -180 y 180"
+        if not (ValidadorRutas.LAT_MIN <= lat <= ValidadorRutas.LAT_MAX):
+            return False, f"Latitud fuera del area de Lima: {lat}. Debe estar entre {ValidadorRutas.LAT_MIN} y {ValidadorRutas.LAT_MAX}"
+        if not (ValidadorRutas.LON_MIN <= lon <= ValidadorRutas.LON_MAX):
+            return False, f"Longitud fuera del area de Lima: {lon}. Debe estar entre {ValidadorRutas.LON_MIN} y {ValidadorRutas.LON_MAX}"
+        
+        if cantidad_destinos > ValidadorRutas.MAX_DESTINOS:
+            return False, f"No se pueden agregar mas de {ValidadorRutas.MAX_DESTINOS} destinos"
+        
+        if cantidad_destinos > capacidad_maxima:
+            return False, f"La cantidad de destinos ({cantidad_destinos}) excede la capacidad de entrega del vivero ({capacidad_maxima})"
+        
+        if demanda_total is not None:
+            # Resta de Counter: solo quedan las flores con demanda mayor al stock,
+            # en el orden de la demanda
+            faltante = Counter(demanda_total) - Counter(stock_acumulado)
+            if faltante:
+                flor = next(iter(faltante))
+                req_total = demanda_total[flor]
+                disponible = stock_acumulado.get(flor, 0)
+                return False, f"Stock insuficiente de {flor}: disponible={disponible}, requerido={req_total}.\nAsegure selección de viveros suplementarios que sumen el stock necesario y confirme el origen activo."
+        
+        if nodo_id is not None:
+            if not isinstance(nodo_id, int):
+                return False, "El ID del nodo debe ser un numero entero"
+            if nodo_id not in grafo:
+                return False, f"El nodo {nodo_id} no existe en el grafo"
+        
+        return True, None
@@ -48,6 +48,7 @@ class Pedido:
         self.pedido_id = pedido_id
         self.vivero_origen_id = vivero_origen_id
         self.destinos: List[Destino] = []
+        self._version = 0  # Se incrementa en cada cambio de destinos (invalida caches)
     
     def agregar_destino(self, destino: Destino) -> bool:
         """
@@ -63,6 +64,7 @@ class Pedido:
             return False
         
         self.destinos.append(destino)
+        self._version += 1
         return True
     
     def eliminar_destino(self, destino_id: int) -> bool:
@@ -75,6 +77,7 @@ class Pedido:
         for i, destino in enumerate(self.destinos):
             if destino.destino_id == destino_id:
                 self.destinos.pop(i)
+                self._version += 1
                 return True
         return False
     
@@ -92,6 +95,7 @@ class Pedido:
                     return False
                 destino.lat = nueva_lat
                 destino.lon = nueva_lon
+                self._version += 1
                 return True
         return False
     
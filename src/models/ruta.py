@@ -27,9 +27,22 @@ class Ruta:
         self.distancia_total = distancia_total
         self.tiempo_total = tiempo_total
         self.fecha_calculo = datetime.now()
-        self.tiempo_computo = 0.0  # Tiempo de calculo en segundos
+        self.tiempo_computo_ns = 0  # Tiempo de calculo en nanosegundos (perf_counter_ns)
         self.camino_completo: List[int] = []  # Nodos intermedios
         self.metricas_segmentos: List[Dict] = []  # Metricas por segmento
+        # Resumen y orden de visitas ya calculados (la ruta no cambia una vez
+        # armada); agregar_segmento los invalida
+        self._resumen_cache: Optional[Dict] = None
+        self._orden_cache: Optional[List[Dict]] = None
+    
+    @property
+    def tiempo_computo(self) -> float:
+        """Tiempo de calculo en segundos"""
+        return self.tiempo_computo_ns / 1e9
+    
+    @tiempo_computo.setter
+    def tiempo_computo(self, segundos: float):
+        self.tiempo_computo_ns = round(segundos * 1e9)
     
     def calcular_metricas(self):
         """Calcula metricas derivadas"""
@@ -55,6 +68,8 @@ class Ruta:
     def agregar_segmento(self, desde_nodo: int, hasta_nodo: int, 
                         distancia: float, tiempo: float):
         """Agrega metricas de un segmento de la ruta"""
+        self._resumen_cache = None
+        self._orden_cache = None
         self.metricas_segmentos.append({
             'desde': desde_nodo,
             'hasta': hasta_nodo,
@@ -62,6 +77,16 @@ class Ruta:
             'tiempo_min': tiempo
         })
     
+    def agregar_segmentos_bulk(self, desde_nodos: List[int], hasta_nodos: List[int],
+                               distancias: List[float], tiempos: List[float]):
+        """Agrega las metricas de varios segmentos de una vez (en orden)"""
+        self._resumen_cache = None
+        self._orden_cache = None
+        self.metricas_segmentos.extend(
+            {'desde': desde, 'hasta': hasta, 'distancia_km': distancia, 'tiempo_min': tiempo}
+            for desde, hasta, distancia, tiempo in zip(desde_nodos, hasta_nodos, distancias, tiempos)
+        )
+    
     def exportar_orden_visitas(self) -> List[Dict]:
         """
         Exporta orden de visitas con metricas
@@ -69,6 +94,9 @@ class Ruta:
         Returns:
             Lista de diccionarios con informacion de cada parada
         """
+        if self._orden_cache is not None:
+            return self._orden_cache
+        
         orden = []
         retorna_origen = len(self.secuencia_visitas) > 1 and (self.secuencia_visitas[-1] == self.secuencia_visitas[0])
         
@@ -99,6 +127,7 @@ class Ruta:
             
             orden.append(parada)
         
+        self._orden_cache = orden
         return orden
     
     def obtener_resumen(self) -> Dict:
@@ -108,9 +137,12 @@ class Ruta:
         Returns:
             Diccionario con metricas principales
         """
+        if self._resumen_cache is not None:
+            return self._resumen_cache
+        
         self.calcular_metricas()
         
-        return {
+        self._resumen_cache = {
             'ruta_id': self.ruta_id,
             'origen_nodo': self.origen_nodo,
             'numero_paradas': self.numero_paradas,
@@ -121,6 +153,7 @@ class Ruta:
             'tiempo_computo_s': round(self.tiempo_computo, 3),
             'fecha_calculo': self.fecha_calculo.strftime('%Y-%m-%d %H:%M:%S')
         }
+        return self._resumen_cache
     
     def __repr__(self):
         return f"Ruta({self.ruta_id}, paradas={self.numero_paradas}, dist={self.distancia_total:.2f}km, tiempo={self.tiempo_total:.2f}min)"
@@ -4,16 +4,27 @@ Descripcion: Carga datos desde CSVs (lima_nodes, lima_edges, viveros, trafico)
 """
 
 import csv
+import hashlib
 import os
+import tempfile
+import zipfile
+import numpy as np
 import pandas as pd
 from typing import Dict, Tuple
 from datetime import datetime
 
+# Cache en disco del grafo ya procesado, una entrada por contenido de los CSV
+DIRECTORIO_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'flora')
+
 
 def cargar_grafo_lima() -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[float, float]]]:
     """
     Construye grafo desde lima_nodes.csv y lima_edges.csv
     
+    El resultado se guarda como arrays en DIRECTORIO_CACHE con el hash de los
+    CSV en el nombre; en los siguientes arranques se reconstruye desde ahi sin
+    volver a parsear el texto.
+    
     Returns:
         Tupla (grafo_dict, nodos_coords)
         - grafo_dict: {nodo: {vecino: distancia}}
@@ -27,6 +38,20 @@ def cargar_grafo_lima() -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[fl
     if not os.path.exists(ruta_aristas):
         raise FileNotFoundError(f"No encontrado: {ruta_aristas}")
     
+    ruta_cache = os.path.join(DIRECTORIO_CACHE, f"grafo_{_hash_archivos(ruta_nodos, ruta_aristas)}.npz")
+    if os.path.exists(ruta_cache):
+        try:
+            with np.load(ruta_cache) as datos:
+                return _grafo_desde_arrays(datos['ids'], datos['lat'], datos['lon'],
+                                           datos['nodo1'], datos['nodo2'], datos['distancia'])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Cache ilegible (p. ej. escritura interrumpida): se descarta y se
+            # reconstruye desde los CSV
+            try:
+                os.remove(ruta_cache)
+            except OSError:
+                pass
+    
     # Cargar nodos con coordenadas
     nodos_coords = {}
     with open(ruta_nodos, 'r', encoding='utf-8') as f:
@@ -37,8 +62,8 @@ def cargar_grafo_lima() -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[fl
             lon = float(fila['lon'])
             nodos_coords[nodo_id] = (lat, lon)
     
-    # Construir grafo (diccionario de adyacencia) - estilo examples-guide
-    grafo = {}
+    # Aristas validas en el orden del CSV (el mismo con el que se arma el grafo)
+    nodos1, nodos2, distancias = [], [], []
     with open(ruta_aristas, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for fila in reader:
@@ -49,14 +74,80 @@ def cargar_grafo_lima() -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[fl
             if node1 not in nodos_coords or node2 not in nodos_coords:
                 continue
             
-            # Grafo no dirigido
-            if node1 not in grafo:
-                grafo[node1] = {}
-            if node2 not in grafo:
-                grafo[node2] = {}
-            
-            grafo[node1][node2] = distancia
-            grafo[node2][node1] = distancia
+            nodos1.append(node1)
+            nodos2.append(node2)
+            distancias.append(distancia)
+    
+    ids = np.fromiter(nodos_coords, dtype=np.int64, count=len(nodos_coords))
+    coords = np.array(list(nodos_coords.values()), dtype=np.float64).reshape(-1, 2)
+    arrays = {
+        'ids': ids, 'lat': coords[:, 0], 'lon': coords[:, 1],
+        'nodo1': np.array(nodos1, dtype=np.int64), 'nodo2': np.array(nodos2, dtype=np.int64),
+        'distancia': np.array(distancias, dtype=np.float64),
+    }
+    _guardar_cache(ruta_cache, arrays)
+    
+    return _grafo_desde_arrays(**arrays)
+
+
+def _guardar_cache(ruta_cache: str, arrays: Dict[str, np.ndarray]):
+    """
+    Escribe la cache en un archivo temporal del mismo directorio y lo mueve a
+    su nombre final con os.replace (atomico): una escritura interrumpida o dos
+    sesiones arrancando a la vez nunca dejan un .npz a medias en ruta_cache
+    
+    Args:
+        ruta_cache: Ruta final del .npz
+        arrays: Arrays a guardar por nombre
+    """
+    ruta_temporal = None
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=DIRECTORIO_CACHE, suffix='.npz.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(ruta_temporal, ruta_cache)
+    except OSError:
+        # Sin permisos de escritura: se trabaja sin cache
+        if ruta_temporal is not None:
+            try:
+                os.remove(ruta_temporal)
+            except OSError:
+                pass
+
+
+def _hash_archivos(*rutas: str) -> str:
+    """SHA-1 (16 caracteres) del contenido de los archivos"""
+    h = hashlib.sha1()
+    for ruta in rutas:
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+    return h.hexdigest()[:16]
+
+
+def _grafo_desde_arrays(ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, nodo1: np.ndarray,
+                        nodo2: np.ndarray, distancia: np.ndarray
+                        ) -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[float, float]]]:
+    """
+    Arma el grafo y las coordenadas a partir de los arrays de nodos y aristas
+    
+    Returns:
+        Tupla (grafo_dict, nodos_coords)
+    """
+    nodos_coords = dict(zip(ids.tolist(), zip(lat.tolist(), lon.tolist())))
+    
+    # Construir grafo (diccionario de adyacencia) - estilo examples-guide
+    grafo = {}
+    for node1, node2, dist in zip(nodo1.tolist(), nodo2.tolist(), distancia.tolist()):
+        # Grafo no dirigido
+        if node1 not in grafo:
+            grafo[node1] = {}
+        if node2 not in grafo:
+            grafo[node2] = {}
+        
+        grafo[node1][node2] = dist
+        grafo[node2][node1] = dist
     
     return grafo, nodos_coords
 
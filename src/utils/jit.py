@@ -0,0 +1,21 @@
+"""
+Modulo: jit.py
+Descripcion: Acceso opcional a numba para los nucleos compilados
+
+Si numba no esta instalado, njit deja las funciones sin compilar, prange se
+comporta como range y NUMBA_DISPONIBLE es False para que los llamadores
+elijan su version en Python/NumPy.
+"""
+
+try:
+    from numba import njit, prange
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    # numba es opcional: sin el, el decorador no hace nada
+    NUMBA_DISPONIBLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        def decorador(func):
+            return func
+        return decorador
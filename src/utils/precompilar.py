@@ -0,0 +1,88 @@
+"""
+Modulo: precompilar.py
+Descripcion: Compila por adelantado los nucleos numba del proyecto
+
+Los nucleos usan cache=True, asi que numba guarda el codigo nativo en
+__pycache__ la primera vez que se ejecutan. Este script los ejecuta una vez
+sobre un grafo pequeño, por los mismos caminos que usa la aplicacion (y con
+los mismos tipos de argumentos), para que el primer calculo de ruta en la
+aplicacion cargue el codigo ya compilado en lugar de esperar al JIT.
+
+Uso:
+    python -m src.utils.precompilar
+"""
+
+import time
+from typing import Dict, Tuple
+
+from .jit import NUMBA_DISPONIBLE
+
+LADO_GRILLA = 6
+PASO_GRADOS = 0.001
+ORIGEN_GRILLA = (-12.05, -77.05)
+
+
+def _grafo_grilla() -> Tuple[Dict[int, Dict[int, float]], Dict[int, Tuple[float, float]]]:
+    """
+    Grilla de calles pequeña en Lima, con aristas en ambos sentidos
+
+    Returns:
+        Tupla (grafo, nodos_coords)
+    """
+    grafo: Dict[int, Dict[int, float]] = {}
+    coords: Dict[int, Tuple[float, float]] = {}
+    for fila in range(LADO_GRILLA):
+        for col in range(LADO_GRILLA):
+            nodo = fila * LADO_GRILLA + col
+            coords[nodo] = (ORIGEN_GRILLA[0] + fila * PASO_GRADOS, ORIGEN_GRILLA[1] + col * PASO_GRADOS)
+            grafo[nodo] = {}
+    for nodo in grafo:
+        fila, col = divmod(nodo, LADO_GRILLA)
+        if col + 1 < LADO_GRILLA:
+            grafo[nodo][nodo + 1] = grafo[nodo + 1][nodo] = 110.0
+        if fila + 1 < LADO_GRILLA:
+            grafo[nodo][nodo + LADO_GRILLA] = grafo[nodo + LADO_GRILLA][nodo] = 110.0
+    return grafo, coords
+
+
+def precompilar() -> float:
+    """
+    Ejecuta cada nucleo compilado una vez para llenar la cache de numba
+
+    Returns:
+        Segundos empleados
+    """
+    # Importes locales: el modulo se puede importar sin pagar la carga de numba
+    from ..controllers.calculador_rutas import CalculadorRutas
+    from ..controllers.generador_guia_ruta import GeneradorGuiaRuta
+    from ..controllers.gestor_rutas import GestorRutas, _indice_nodo_cercano
+
+    inicio = time.time()
+    grafo, coords = _grafo_grilla()
+    ultimo = len(grafo) - 1
+
+    # A*, Dijkstra multi-destino y Held-Karp (necesita al menos dos destinos)
+    calculador = CalculadorRutas(grafo, 1.0, coords)
+    calculador.dijkstra(0, ultimo)
+    destinos = [LADO_GRILLA - 1, ultimo, ultimo - LADO_GRILLA + 1]
+    calculador.precalcular_matriz_distancias([0] + destinos)
+    _, secuencia = calculador.calcular_ruta_tsp(0, destinos, True)
+    camino, _ = calculador.calcular_camino_completo(secuencia)
+
+    # Nodo cercano (recorrido lineal, usado cuando no hay scipy)
+    gestor = GestorRutas(grafo, 1.0, coords)
+    _indice_nodo_cercano(0.0, 0.0, 0.0, gestor._coords_x, gestor._coords_y, gestor._coords_z)
+
+    # Angulos de giro y distancias de la guia, para una y varias rutas
+    generador = GeneradorGuiaRuta(grafo, coords)
+    generador.generar_guia(camino)
+    generador.generar_guias([camino, camino[::-1]])
+
+    return time.time() - inicio
+
+
+if __name__ == '__main__':
+    if not NUMBA_DISPONIBLE:
+        print("numba no esta instalado: no hay nucleos que precompilar")
+    else:
+        print(f"Nucleos compilados en {precompilar():.1f} s")
@@ -39,6 +39,12 @@ def cargar_datos_iniciales():
     return grafo, nodos_coords, viveros_df, factor_trafico
 
 
+@st.cache_resource
+def crear_generador_guia(_grafo, _nodos_coords):
+    """Crea el generador de guias una sola vez (indexa las coordenadas al crearse)"""
+    return GeneradorGuiaRuta(_grafo, _nodos_coords)
+
+
 @st.cache_resource
 def inicializar_gestor(_grafo, _factor_trafico, _viveros_df, _nodos_coords):
     """Inicializa el gestor de rutas y registra viveros"""
@@ -495,8 +501,9 @@ def mostrar_panel_control(gestor, viveros_df, nodos_coords, grafo):
                     }
                     if nuevo_destino not in st.session_state.destinos:
                         st.session_state.destinos.append(nuevo_destino)
-                    # Marcar ruta como no calculada para limpiar ruta anterior del mapa
-                    st.session_state.ruta_calculada = False
+                    # Mantener la ruta solo si el gestor la actualizo con el nuevo destino;
+                    # si no, limpiar la ruta anterior del mapa
+                    st.session_state.ruta_calculada = gestor.ruta_vigente
                     st.success("Destino agregado")
                     st.rerun()
                 else:
@@ -523,8 +530,9 @@ def mostrar_panel_control(gestor, viveros_df, nodos_coords, grafo):
                                 d for d in st.session_state.destinos 
                                 if d['id'] != dest['id']
                             ]
-                            # Marcar ruta como no calculada para limpiar ruta del mapa
-                            st.session_state.ruta_calculada = False
+                            # Mantener la ruta si el gestor la actualizo sin este destino;
+                            # si no, limpiar la ruta del mapa
+                            st.session_state.ruta_calculada = gestor.ruta_vigente
                             st.rerun()
                         else:
                             st.error(error)
@@ -574,15 +582,19 @@ def mostrar_panel_control(gestor, viveros_df, nodos_coords, grafo):
                             st.sidebar.error(f"Error al crear pedido en gestor: {err}")
                             proceed = False
                         else:
-                            # agregar destinos desde la UI al gestor
+                            # agregar destinos desde la UI al gestor en un solo lote
+                            # (rango y nodos cercanos se resuelven para todas las filas)
                             recon_ok = True
                             recon_err = None
-                            for d in ui_destinos:
-                                try:
-                                    ok, err = gestor.agregar_destino(d['lat'], d['lon'], d['flores'])
-                                except Exception as e:
-                                    ok = False
-                                    err = str(e)
+                            try:
+                                resultados = gestor.agregar_destinos_batch(
+                                    [(d['lat'], d['lon']) for d in ui_destinos],
+                                    [d['flores'] for d in ui_destinos],
+                                    detener_en_error=True
+                                )
+                            except Exception as e:
+                                resultados = [(False, str(e))]
+                            for ok, err in resultados:
                                 if not ok:
                                     recon_ok = False
                                     recon_err = err
@@ -1032,7 +1044,7 @@ def mostrar_resumen_metricas(gestor):
                 st.warning("⚠️ No se pudo cargar el grafo de Lima. Guía de ruta no disponible.")
             else:
                 # 2. Crear generador
-                generador = GeneradorGuiaRuta(grafo, nodos_coords)
+                generador = crear_generador_guia(grafo, nodos_coords)
                 
                 # 3. Obtener secuencia completa de nodos desde ruta
                 if gestor.ruta_actual and gestor.ruta_actual.camino_completo: